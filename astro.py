@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared astronomy resources for the Big Ring Theory app.
+
+The JPL ephemeris (de421.bsp) and the Skyfield timescale are created once per
+process and reused by every caller. Streamlit re-executes the app script on
+each interaction but keeps imported modules alive, so everything cached here
+is shared by all sessions of the same server.
+
+Skyfield and NumPy are imported on first use, so importing this module is cheap.
+"""
+
+import datetime
+import threading
+
+
+EPHEMERIS_FILE = 'de421.bsp'
+
+_lock = threading.Lock()
+_planets = None
+_ts = None
+_warm_thread = None
+
+
+def _load():
+    global _planets, _ts
+    with _lock:
+        if _planets is None:
+            from skyfield.api import load
+
+            # jplephem memory-maps the kernel, so only the segments we touch are paged in
+            ts = load.timescale()
+            planets = load(EPHEMERIS_FILE)
+            # Touch the earth, sun and moon segments once so their data is read
+            # while holding the lock instead of lazily from several threads
+            t = ts.tt_jd(2451545.0)
+            planets['earth'].at(t).observe(planets['sun'])
+            planets['earth'].at(t).observe(planets['moon'])
+            _ts = ts
+            _planets = planets
+    return _planets, _ts
+
+
+# Ephemeris (planets) loaded once per process
+def get_ephemeris():
+    if _planets is None:
+        _load()
+    return _planets
+
+
+# Timescale loaded once per process
+def get_timescale():
+    if _ts is None:
+        _load()
+    return _ts
+
+
+# Warm-up hook: load the ephemeris ahead of the first request
+# With background=True the load runs in a daemon thread and this returns immediately
+def warm_up(background=True):
+    global _warm_thread
+    if _planets is not None:
+        return
+    if not background:
+        _load()
+        return
+    with _lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_load, name="ephemeris-warm-up", daemon=True)
+            _warm_thread.start()
+
+
+# Dates for a window of N days starting at start_date
+def window_dates(start_date, days):
+    return [start_date + datetime.timedelta(days=i) for i in range(days)]
+
+
+# Moon illuminated fraction (f2) and Sun-Earth distance in km (f3) for many dates at once
+# Pass a list of dates, or a start date plus the number of days.
+# Every date is evaluated at 00:00 UTC in one vectorized Skyfield call.
+def sun_moon_features(dates, days=None):
+    import numpy as np
+
+    if days is not None:
+        dates = window_dates(dates, days)
+    if len(dates) == 0:
+        return np.empty(0), np.empty(0)
+
+    planets = get_ephemeris()
+    ts = get_timescale()
+    t = ts.utc([d.year for d in dates], [d.month for d in dates], [d.day for d in dates])
+
+    earth = planets['earth'].at(t)
+    sun_pos = earth.observe(planets['sun'])
+    moon_pos = earth.observe(planets['moon'])
+
+    # Illuminated fraction from the real Sun-Moon elongation seen from Earth
+    elongation = moon_pos.separation_from(sun_pos).radians
+    f2 = (1 - np.cos(elongation)) / 2
+    f3 = sun_pos.distance().km
+    return np.asarray(f2), np.asarray(f3)
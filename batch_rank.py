@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rank proposal dates for many cities at once, without the Streamlit UI.
+
+Each city runs the same pipeline as the app (twilight features, twilight
+score, weather prediction, romance score) in a pool of worker processes.
+Every worker loads the ephemeris once when it starts. Results are written to
+CSV or Parquet as each city finishes, so memory stays flat however long the
+city list is.
+
+Rate limits (ratelimit.py) are per process, so the parent geocodes each city
+itself, at Nominatim's one request per second, before handing it to a
+worker; workers find it in geo.py's SQLite file. Each worker also gets an
+equal share of the per-upstream rates, so the pool as a whole stays within
+them.
+
+    python batch_rank.py cities.txt --start 2026-05-01 --end 2026-05-30 --out ranks.csv
+    python batch_rank.py cities.txt --start 2026-05-01 --days 90 --top 0 --out ranks.parquet --workers 16
+
+The cities file has one city per line; blank lines and lines starting with # are ignored.
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+COLUMNS = ["city", "rank", "date", "romance_score", "twilight_score", "weather_score", "vibe",
+           "f1", "f2", "f3", "skipped_days"]
+
+
+def _init_worker(workers):
+    import astro
+    import ratelimit
+
+    for limits in [ratelimit.DEFAULT_LIMITS, *ratelimit.LIMITS.values()]:
+        limits["rate"] /= workers
+    astro.warm_up(background=False)
+
+
+# Ranked dates for one city; raises ValueError, with engine's messages, when the city can't be scored
+def rank_city(city_name, start_date, days, top=3):
+    import engine
+
+    _, _, df, skipped_days = engine.score_window(city_name, start_date, days)
+
+    df = df.sort_values("romance_score", ascending=False)
+    if top:
+        df = df.head(top)
+    df["city"] = city_name
+    df["rank"] = range(1, len(df) + 1)
+    df["skipped_days"] = skipped_days
+    return df[COLUMNS]
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode="w" if self.header else "a", header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+# Needs pyarrow, which the app itself doesn't
+class ParquetWriter:
+    def __init__(self, path):
+        import pyarrow  # noqa: F401  (fail early with a clear ImportError)
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = df.assign(date=df["date"].astype(str))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path):
+    if path.endswith(".parquet"):
+        return ParquetWriter(path)
+    return CsvWriter(path)
+
+
+def read_cities(path):
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rank proposal dates for a list of cities.")
+    parser.add_argument("cities", help="file with one city per line")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="first date of the window (YYYY-MM-DD, default today)")
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument("--end", type=datetime.date.fromisoformat, help="last date of the window")
+    window.add_argument("--days", type=int, default=30, help="window length in days (default 30)")
+    parser.add_argument("--top", type=int, default=3, help="dates kept per city, 0 for all (default 3)")
+    parser.add_argument("--out", default="ranks.csv", help="output .csv or .parquet (default ranks.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    args = parser.parse_args(argv)
+    if args.end is not None:
+        args.days = (args.end - args.start).days + 1
+    if args.days < 1:
+        parser.error("the window must contain at least one day")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cities = read_cities(args.cities)
+    writer = open_writer(args.out)
+
+    import engine
+
+    done = failed = 0
+
+    def finish(future, city):
+        nonlocal done, failed
+        try:
+            writer.write(future.result())
+            done += 1
+        except Exception as e:
+            failed += 1
+            print(f"{city}: {e}", file=sys.stderr)
+
+    try:
+        # Spawned, not forked: this process holds an open SQLite connection and thread pools by then
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(args.workers,)) as pool:
+            futures = {}
+            for city in cities:
+                # Geocoded here, under this process's Nominatim limit, and stored for the workers
+                try:
+                    engine.get_location(city)
+                except ValueError as e:
+                    failed += 1
+                    print(f"{city}: {e}", file=sys.stderr)
+                    continue
+                futures[pool.submit(rank_city, city, args.start, args.days, args.top)] = city
+                for future in [f for f in futures if f.done()]:
+                    finish(future, futures.pop(future))
+            for future in as_completed(futures):
+                finish(future, futures[future])
+    finally:
+        writer.close()
+
+    print(f"{done} cities ranked, {failed} failed -> {args.out}")
+    return 0 if done or not cities else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
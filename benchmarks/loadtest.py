@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent load test of one app instance against the offline upstream stand-in.
+
+N simulated sessions, one thread each as in a Streamlit server, submit
+(city, start date) requests drawn from a realistic mix: a few cities take
+most of the traffic (Zipf weights over the city list), start dates fall in
+the 90 days the date picker allows, and a share of requests use the
+best-dates-this-year mode. Each session waits for its answer, thinks, and
+asks again.
+
+Two ways to drive the app:
+
+- pipeline (default): the calls FINAL_BRISHACK.py makes on Calculate
+  (engine.iter_rank_dates, or engine.best_dates in year mode), without the UI
+- apptest: the real script in Streamlit's AppTest, with the city and date
+  typed in and Calculate clicked
+
+Geocoding and Open-Meteo are served by stub_upstream.py in a separate
+process, with configurable latency and error rate, so CPU and memory figures
+are the app's own. The ephemeris (de421.bsp) must be available locally.
+
+Each step runs a number of concurrent users for a fixed time and reports
+throughput, latency percentiles (and time to the first stage in pipeline
+mode), errors, CPU use and peak RSS. Requests the app answers with one of
+SERVED_MESSAGES (white nights, too few valid days, unknown city) count as
+served, under "msgs"; any other message, such as weather that couldn't be
+fetched, is an error:
+
+    python benchmarks/loadtest.py --users 1,2,4,8,16,32 --duration 30
+    python benchmarks/loadtest.py --mode apptest --users 1,4,8 --latency 0.2 --error-rate 0.02
+    python benchmarks/loadtest.py --users 8 --cold --json loadtest.json
+
+Caches stay warm from one step to the next (a long-running instance) unless
+--cold clears them at the start of every step.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+APP = os.path.join(ROOT, "FINAL_BRISHACK.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import stub_upstream  # noqa: E402
+
+
+HORIZON_DAYS = 90           # the app's date picker: today to 90 days ahead
+RSS_SAMPLE_S = 0.05
+
+# Starts of the app's error messages that are answers about the city, not failures
+SERVED_MESSAGES = ("Too few valid days", "City not found")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Highest resident set size seen while running, sampled in a background thread
+class RssSampler:
+    def __init__(self):
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_S):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# stub_upstream.py serving in its own process; returns (process, env)
+def start_stub(latency, jitter, error_rate):
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "stub_upstream.py"), "serve", "--port", str(port),
+                             "--latency", str(latency), "--jitter", str(jitter), "--error-rate", str(error_rate)],
+                            stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            if time.time() > deadline or proc.poll() is not None:
+                proc.kill()
+                raise RuntimeError("the upstream stand-in did not start")
+            time.sleep(0.05)
+    return proc, stub_upstream.env("127.0.0.1", port)
+
+
+# Request mix: Zipf-weighted cities, start dates within the picker's range, some year-mode runs
+class Mix:
+    def __init__(self, cities, zipf, year_share):
+        self.cities = cities
+        self.weights = [1 / (rank + 1) ** zipf for rank in range(len(cities))]
+        self.year_share = year_share
+
+    def draw(self, rng):
+        city = rng.choices(self.cities, self.weights)[0]
+        start = datetime.date.today() + datetime.timedelta(days=rng.randint(0, HORIZON_DAYS))
+        return city, start, rng.random() < self.year_share
+
+
+# One request through the app's Calculate path; returns seconds to the first stage
+def run_pipeline(city, start, year_mode):
+    import engine
+
+    t0 = time.perf_counter()
+    if year_mode:
+        engine.best_dates(city, start)
+        return time.perf_counter() - t0
+    first = None
+    for _ in engine.iter_rank_dates(city, start):
+        if first is None:
+            first = time.perf_counter() - t0
+    return first
+
+
+# One request through the Streamlit script itself; the app's error messages are raised as ValueError
+def run_apptest(city, start, year_mode):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300).run()
+    box = at.selectbox[0] if len(at.selectbox) else at.text_input[0]
+    box.set_value(city)
+    at.date_input[0].set_value(start)
+    at.toggle[0].set_value(year_mode)
+    at.button[0].click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    if len(at.error):
+        raise ValueError(at.error[0].value)
+    return None
+
+
+def clear_caches():
+    import climate_store
+    import engine
+    import geo
+
+    engine.clear_day_caches()
+    geo.clear_cache()
+    climate_store.clear()
+
+
+# `users` sessions for `duration` seconds; returns the step's report
+def run_step(users, duration, request, mix, think, seed):
+    latencies, firsts = [], []
+    messages = 0
+    errors = Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def session(i):
+        nonlocal messages
+        rng = random.Random(seed * 1000 + i)
+        while time.perf_counter() < stop_at:
+            city, start, year_mode = mix.draw(rng)
+            t0 = time.perf_counter()
+            first = outcome = None
+            try:
+                first = request(city, start, year_mode)
+            except Exception as e:
+                served = isinstance(e, ValueError) and str(e).startswith(SERVED_MESSAGES)
+                outcome = "message" if served else re.sub(r"\d+", "N", f"{type(e).__name__}: {e}")
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if outcome in (None, "message"):
+                    latencies.append(elapsed)
+                    messages += outcome == "message"
+                    if first is not None:
+                        firsts.append(first)
+                else:
+                    errors[outcome] += 1
+            if think:
+                time.sleep(rng.expovariate(1 / think))
+
+    cpu0 = resource.getrusage(resource.RUSAGE_SELF)
+    t0 = time.perf_counter()
+    with RssSampler() as rss:
+        threads = [threading.Thread(target=session, args=(i,), name=f"session-{i}") for i in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - t0
+    cpu1 = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (cpu1.ru_utime - cpu0.ru_utime) + (cpu1.ru_stime - cpu0.ru_stime)
+
+    n_errors = sum(errors.values())
+    return {
+        "users": users,
+        "requests": len(latencies) + n_errors,
+        "messages": messages,
+        "errors": n_errors,
+        "error_kinds": dict(errors.most_common(5)),
+        "throughput": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "first_stage_p50_ms": percentile(firsts, 50) * 1000,
+        "cpu_percent": 100 * cpu / wall,
+        "peak_rss_mb": rss.peak / 2**20,
+        "wall_s": wall,
+    }
+
+
+def print_report(steps, p99_target_ms):
+    print(f"\n{'users':>5} {'reqs':>6} {'msgs':>5} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'1st p50':>8} {'cpu %':>6} {'peak RSS':>9}")
+    for s in steps:
+        print(f"{s['users']:>5} {s['requests']:>6} {s['messages']:>5} {s['errors']:>6} {s['throughput']:>7.2f} {s['p50_ms']:>8.0f} "
+              f"{s['p95_ms']:>8.0f} {s['p99_ms']:>8.0f} {s['first_stage_p50_ms']:>8.0f} {s['cpu_percent']:>6.0f} "
+              f"{s['peak_rss_mb']:>7.0f} MB")
+        for kind, n in s["error_kinds"].items():
+            print(f"      {n} × {kind[:100]}")
+
+    if not steps:
+        return
+    best = max(steps, key=lambda s: s["throughput"])
+    print(f"\npeak throughput {best['throughput']:.2f} req/s at {best['users']} users")
+    # A step with no successful request at all (p99 is NaN) counts as over
+    over = [s for s in steps if not s["p99_ms"] <= p99_target_ms]
+    if over:
+        print(f"p99 above {p99_target_ms:.0f} ms from {over[0]['users']} users")
+    else:
+        print(f"p99 within {p99_target_ms:.0f} ms at every step")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test against stubbed upstreams.")
+    parser.add_argument("--mode", choices=["pipeline", "apptest"], default="pipeline")
+    parser.add_argument("--users", default="1,2,4,8,16", help="concurrent sessions per step, comma-separated")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per step")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a session waits between requests")
+    parser.add_argument("--cities", help="file with one city per line (default: the stand-in's cities)")
+    parser.add_argument("--zipf", type=float, default=1.0, help="skew of the city mix (0 for uniform)")
+    parser.add_argument("--year-share", type=float, default=0.1, help="fraction of requests in year mode")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every upstream response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="± seconds of random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests answered 503")
+    parser.add_argument("--cold", action="store_true", help="clear every cache at the start of each step")
+    parser.add_argument("--p99-target", type=float, default=2000.0, help="acceptable p99 in ms")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+    args.users = [int(n) for n in args.users.split(",")]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stub, env = start_stub(args.latency, args.jitter, args.error_rate)
+    try:
+        # Before the app's modules are imported: they read these at import time
+        os.environ.update(env)
+        os.environ["BRT_CACHE_DIR"] = tempfile.mkdtemp(prefix="brt-load-")
+        os.environ.setdefault("BRT_TRACE_LOG", "off")
+
+        import astro
+
+        astro.warm_up(background=False)
+        if args.cities:
+            with open(args.cities, encoding="utf-8") as f:
+                cities = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        else:
+            cities = list(stub_upstream.load_cities())
+        mix = Mix(cities, args.zipf, args.year_share)
+        request = run_pipeline if args.mode == "pipeline" else run_apptest
+
+        print(f"{args.mode} mode, {len(cities)} cities, upstream latency {args.latency * 1000:.0f} ms "
+              f"± {args.jitter * 1000:.0f} ms, error rate {args.error_rate:.1%}, {args.duration:.0f} s per step")
+        steps = []
+        for users in args.users:
+            if args.cold:
+                clear_caches()
+            steps.append(run_step(users, args.duration, request, mix, args.think, args.seed))
+            s = steps[-1]
+            print(f"  {users} users: {s['throughput']:.2f} req/s, p99 {s['p99_ms']:.0f} ms, {s['errors']} errors")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print_report(steps, args.p99_target)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items()}, "steps": steps}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
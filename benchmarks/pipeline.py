@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-stage benchmark of the romance-score pipeline, fully offline.
+
+Nominatim and Open-Meteo are served by the local stand-in in
+stub_upstream.py (recorded fixtures, synthetic where none are recorded) and
+all caches live in a temporary directory. The ephemeris file de421.bsp must
+already be in the working directory, as Skyfield would otherwise download it.
+
+Every stage is timed for each city (equator to white-night latitudes) and
+window length, and the median is compared with benchmarks/baseline.json:
+
+    python benchmarks/pipeline.py                       # run and compare
+    python benchmarks/pipeline.py --save-baseline       # record this machine's baseline
+    python benchmarks/pipeline.py --cities Bristol,Tromso --days 30,365 --threshold 0.25
+    python benchmarks/pipeline.py --require-baseline    # CI: a missing baseline fails
+
+The exit status is 1 when any stage is slower than its baseline by more than
+--threshold (a fraction, default 0.3) and by more than --min-delta-ms. The
+baseline is per machine, so none is committed: CI records one on its
+reference runner with --save-baseline and keeps it. Without a baseline the
+run only reports timings and exits 0, unless --require-baseline is given;
+then a missing baseline, or a stage it has no entry for, fails the run.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.join(ROOT, "benchmarks")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+
+import stub_upstream  # noqa: E402
+
+BASELINE = os.path.join(BENCH, "baseline.json")
+
+DEFAULT_CITIES = ["Quito", "Singapore", "Sydney", "Bristol", "Ushuaia", "Oslo", "Reykjavik", "Tromso"]
+DEFAULT_DAYS = [30, 90, 365]
+START = datetime.date(2026, 3, 1)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - t0) * 1000
+
+
+# Median milliseconds of each stage for one city and window
+def bench_case(city_name, days, repeat):
+    import astro
+    import climate_store
+    import engine
+    import geo
+
+    samples = {}
+
+    def add(stage, ms):
+        samples.setdefault(stage, []).append(ms)
+
+    for _ in range(repeat):
+        geo.clear_cache()
+        engine.clear_day_caches()
+        (city, tz), ms = timed(engine.get_location, city_name)
+        add("geocode_cold", ms)
+        _, ms = timed(engine.get_location, city_name)
+        add("geocode_warm", ms)
+
+        (df, skipped), ms = timed(engine.thirty_days_values, city, START, tz, days)
+        add("twilight_features", ms)
+        _, ms = timed(engine.thirty_days_values, city, START + datetime.timedelta(days=1), tz, days)
+        add("twilight_slide", ms)
+        _, ms = timed(astro.sun_moon_features, list(df["date"]))
+        add("sun_moon_batch", ms)
+
+        if len(df) >= 2:
+            _, ms = timed(engine.calculate_final_score, df.copy())
+            add("final_score", ms)
+
+        climate_store.clear(climate_store.cell_of(city.latitude, city.longitude))
+        _, ms = timed(engine.get_romantic_weather_prediction, city_name, START, days)
+        add("weather_cold", ms)
+        engine.clear_day_caches()
+        _, ms = timed(engine.get_romantic_weather_prediction, city_name, START, days)
+        add("weather_warm", ms)
+        _, ms = timed(engine.get_romantic_weather_prediction, city_name, START + datetime.timedelta(days=1), days)
+        add("weather_slide", ms)
+
+        # Nothing has filled the pink-time day cache yet this repeat
+        _, ms = timed(engine.pink_time_windows, city, list(df["date"]), tz)
+        add("pink_time_all_days", ms)
+
+        if len(df) >= 5:
+            _, ms = timed(engine.rank_dates, city_name, START, days)
+            add("rank_dates_warm", ms)
+            _, ms = timed(engine.rank_dates, city_name, START + datetime.timedelta(days=2), days)
+            add("rank_dates_slide", ms)
+
+    return {stage: statistics.median(values) for stage, values in samples.items()}, skipped
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for key, ms in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if ms > base * (1 + threshold) and ms - base > min_delta_ms:
+            regressions.append((key, base, ms))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage pipeline benchmark.")
+    parser.add_argument("--cities", default=",".join(DEFAULT_CITIES))
+    parser.add_argument("--days", default=",".join(map(str, DEFAULT_DAYS)))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed slowdown as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="fail when there is no baseline, or no entry for a stage (for CI)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = stub_upstream.start()
+    os.environ.update(server.env())
+    os.environ["BRT_CACHE_DIR"] = tempfile.mkdtemp(prefix="brt-bench-")
+
+    import astro
+    _, ms = timed(astro.warm_up, False)
+    print(f"ephemeris load: {ms:.0f} ms\n")
+
+    results = {}
+    for days in [int(d) for d in args.days.split(",")]:
+        for city_name in args.cities.split(","):
+            stages, skipped = bench_case(city_name, days, args.repeat)
+            note = f"  ({skipped} white-night days skipped)" if skipped else ""
+            print(f"{city_name} · {days} days{note}")
+            for stage, ms in stages.items():
+                results[f"{stage}[{city_name},{days}]"] = round(ms, 3)
+                print(f"    {stage:<20} {ms:9.2f} ms")
+
+    server.shutdown()
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"\nbaseline saved to {BASELINE}")
+        return 0
+    if not os.path.exists(BASELINE):
+        print(f"\nno baseline at {BASELINE}; run with --save-baseline to record one")
+        return 1 if args.require_baseline else 0
+
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for key, base, ms in regressions:
+        print(f"REGRESSION {key}: {base:.2f} ms -> {ms:.2f} ms ({ms / base - 1:+.0%})")
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    unmeasured = sorted(key for key in results if key not in baseline)
+    if unmeasured:
+        print(f"{len(unmeasured)} stage(s) not in the baseline: {', '.join(unmeasured)}")
+    return 1 if regressions or (args.require_baseline and unmeasured) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parity check and timing for the vectorized weather scoring.
+
+weather.score_weather() must give exactly the same weather_score and vibe as
+the original row-by-row calc_score (kept below as the reference). Random
+climatology rows, including NaNs and values right on the thresholds, are
+scored both ways and compared; the script exits non-zero on any mismatch.
+
+    python benchmarks/scoring.py [n_rows]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather  # noqa: E402
+
+
+# The original DataFrame.apply version from FINAL_BRISHACK.py
+def calc_score(row):
+    c_score = (100 - row['cloud_cover_mean']) / 100        # 0–1
+    t_score = np.exp(-((row['temperature_2m_max'] - row['ideal_t'])**2) / (2 * 5**2))
+    color_bonus = min(0.1, (row['ozone'] / 350) * 0.1)    # was max 10, now max 0.1
+
+    r_mult = 1.0 if row['precipitation_sum']  < 0.1 else max(0,   1 - row['precipitation_sum']  / 3)
+    w_mult = 1.0 if row['wind_speed_10m_max'] < 12  else max(0.1, 1 - row['wind_speed_10m_max'] / 18)
+    p_mult = 1.0 if row['pm2_5']              < 10  else max(0,   1 - (row['pm2_5'] - 10) / 40)
+
+    finalw_score = (c_score * 0.35) + (t_score * 0.20) + (r_mult * 0.25) + (w_mult * 0.15) + (p_mult * 0.05) + color_bonus
+
+    if r_mult < 0.9:        vibe = "💧 WATER | Trust the flow; clarity comes after the soak."
+    elif w_mult < 0.9:      vibe = "🌬️ AIR | Fresh perspectives are heading your way."
+    elif color_bonus > 8.5: vibe = "🩷 Cotton-candy sky | The ozone is electric. Expect majestic sky hues."
+    elif finalw_score > 80: vibe = "✨ ETHER | THE Perfect Match. The sky is cosmically aligned."
+    elif t_score > 80:      vibe = "🔥 FIRE | Fortune favors the bold—make that big move today."
+    else:                   vibe = "🌿 EARTH | Grounded and stable. A day for steady progress."
+
+    return pd.Series({'weather_score': round(finalw_score, 4), 'vibe': vibe})
+
+
+def random_climatology(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "temperature_2m_max": rng.normal(14, 9, n),
+        "precipitation_sum":  rng.choice([0.0, 0.05, 0.1, 1.5, 3.0, 6.0], n) * rng.random(n) * 2,
+        "cloud_cover_mean":   rng.random(n) * 100,
+        "wind_speed_10m_max": rng.choice([5.0, 12.0, 16.2, 18.0, 30.0], n) * (0.5 + rng.random(n)),
+        "pm2_5":              rng.choice([3.0, 10.0, 25.0, 50.0, 80.0], n) * rng.random(n) * 2,
+        "ozone":              rng.random(n) * 500,
+        "ideal_t":            weather.ideal_temperature(rng.choice([-30, 50]), rng.integers(1, 13, n)),
+    })
+    # Exact thresholds and missing values
+    df.loc[::7, "precipitation_sum"] = 0.1
+    df.loc[::11, "wind_speed_10m_max"] = 12.0
+    df.loc[::13, "pm2_5"] = 10.0
+    for i, col in enumerate(df.columns[:-1]):
+        df.loc[i::97, col] = np.nan
+    return df
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    df = random_climatology(n)
+
+    t0 = time.perf_counter()
+    expected = df.apply(calc_score, axis=1)
+    t1 = time.perf_counter()
+    actual = weather.score_weather(df)
+    t2 = time.perf_counter()
+
+    exp_score = expected["weather_score"].to_numpy(dtype=float)
+    act_score = actual["weather_score"].to_numpy(dtype=float)
+    same_score = (exp_score == act_score) | (np.isnan(exp_score) & np.isnan(act_score))
+    same_vibe = expected["vibe"].to_numpy() == actual["vibe"].to_numpy()
+
+    print(f"rows:        {n}")
+    print(f"row-wise:    {(t1 - t0) * 1000:.1f} ms")
+    print(f"vectorized:  {(t2 - t1) * 1000:.1f} ms  ({(t1 - t0) / (t2 - t1):.0f}x)")
+    print(f"mismatches:  weather_score {int((~same_score).sum())}, vibe {int((~same_vibe).sum())}")
+    if not (same_score.all() and same_vibe.all()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
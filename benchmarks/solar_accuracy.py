@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy and speed of the vectorized solar engine against astral.
+
+Random locations, with the local timezone approximated by longitude, each
+get a window of consecutive days computed by solar.py in one call and by
+astral day by day: sunset, civil dusk and the pink-time band edges. Reports
+the error, any day one side masks and the other doesn't, and the time per
+day of both, plus one call over many locations at once.
+
+    python benchmarks/solar_accuracy.py --locations 500 --days 30 --max-lat 89
+
+The exit status is 1 when an error exceeds solar.ERROR_BOUND or sunset and
+dusk disagree with astral about which days have them.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from astral import Observer  # noqa: E402
+from astral.sun import dusk, sunset  # noqa: E402
+
+import solar  # noqa: E402
+import twilight  # noqa: E402
+
+
+def minutes_after_midnight(t, d):
+    if t is None:
+        return np.nan
+    midnight = datetime.datetime(d.year, d.month, d.day, tzinfo=t.tzinfo)
+    return (t - midnight).total_seconds() / 60
+
+
+def exact(observer, d, tz):
+    values = []
+    for event in (sunset, dusk):
+        try:
+            values.append(minutes_after_midnight(event(observer, d, tzinfo=tz), d))
+        except ValueError:
+            values.append(np.nan)
+    pink = twilight.pink_time_window(observer, d, tzinfo=tz)
+    values.extend([np.nan, np.nan] if pink is None else [minutes_after_midnight(t, d) for t in pink])
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorized solar engine accuracy against astral.")
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--max-lat", type=float, default=89.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    names = ["sunset", "dusk", "pink_start", "pink_end"]
+    errors = {name: [] for name in names}
+    mask_mismatch = dict.fromkeys(names, 0)
+    t_solar = t_exact = 0.0
+    locations = []
+    for _ in range(args.locations):
+        lat, lon = rng.uniform(-args.max_lat, args.max_lat), rng.uniform(-180, 180)
+        start = datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(4 * 365))
+        dates = [start + datetime.timedelta(days=i) for i in range(args.days)]
+        offset = round(lon / 15) * 60
+        tz = datetime.timezone(datetime.timedelta(minutes=offset))
+        locations.append((lat, lon, offset))
+
+        t0 = time.perf_counter()
+        fast = [*solar.sunset_dusk(lat, lon, dates, offset), *solar.band_times(lat, lon, dates, twilight.PINK_TIME, offset)]
+        t1 = time.perf_counter()
+        observer = Observer(lat, lon)
+        ref = np.array([exact(observer, d, tz) for d in dates])
+        t2 = time.perf_counter()
+        t_solar += t1 - t0
+        t_exact += t2 - t1
+
+        for k, name in enumerate(names):
+            got = np.ma.filled(fast[k], np.nan)
+            both = ~np.isnan(got) & ~np.isnan(ref[:, k])
+            mask_mismatch[name] += int((np.isnan(got) != np.isnan(ref[:, k])).sum())
+            errors[name].extend(np.abs(got[both] - ref[both, k]))
+
+    # Every location's window in one broadcast call
+    lats, lons, offsets = (np.array(column)[:, None] for column in zip(*locations))
+    dates = [datetime.date(2025, 6, 1) + datetime.timedelta(days=i) for i in range(args.days)]
+    t0 = time.perf_counter()
+    grid = solar.sunset_dusk(lats, lons, dates, offsets)
+    t_grid = time.perf_counter() - t0
+
+    n = args.locations * args.days
+    print(f"{args.locations} locations × {args.days} days up to ±{args.max_lat}° latitude")
+    print(f"solar {t_solar / n * 1e6:8.1f} µs/day   astral {t_exact / n * 1e6:8.1f} µs/day   "
+          f"broadcast {grid[0].shape} {t_grid / n * 1e6:6.2f} µs/day")
+    worst = 0.0
+    for name in names:
+        errs = np.array(errors[name])
+        worst = max(worst, errs.max())
+        print(f"    {name:<11} max {errs.max():6.3f} min   p99 {np.percentile(errs, 99):6.3f} min   "
+              f"mean {errs.mean():6.3f} min   mask mismatches {mask_mismatch[name]}")
+    ok = worst <= solar.ERROR_BOUND and mask_mismatch["sunset"] == mask_mismatch["dusk"] == 0
+    print(f"\nwithin {solar.ERROR_BOUND} min bound: {'yes' if ok else 'NO'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
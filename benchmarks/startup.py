@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark for the Streamlit app.
+
+1. Import-time report: runs `python -X importtime` on the app's top-level
+   imports and lists the slowest modules (cumulative microseconds).
+2. Idle page load: runs FINAL_BRISHACK.py with Streamlit's AppTest without
+   clicking Calculate, times it, and checks that none of the heavy modules
+   were imported.
+
+    python benchmarks/startup.py            # print the report
+    python benchmarks/startup.py --write    # also refresh benchmarks/startup_report.txt
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "FINAL_BRISHACK.py")
+REPORT = os.path.join(ROOT, "benchmarks", "startup_report.txt")
+
+# What the app imports before anyone clicks Calculate
+TOP_LEVEL_IMPORTS = "import streamlit, datetime, astro, gazetteer"
+
+# Must not be imported by an idle page load
+HEAVY_MODULES = ["pandas", "numpy", "requests", "skyfield", "geopy", "timezonefinder", "astral", "pytz"]
+
+TOP_N = 15
+
+
+def import_time_report(statement=TOP_LEVEL_IMPORTS):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    total = max(r[0] for r in rows) if rows else 0
+    rows.sort(reverse=True)
+    return total, rows[:TOP_N]
+
+
+def idle_page_load(runs=3):
+    from streamlit.testing.v1 import AppTest
+
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        AppTest.from_file(APP, default_timeout=60).run()
+        timings.append(time.perf_counter() - t0)
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    return timings, loaded
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    lines = []
+
+    total, rows = import_time_report()
+    lines.append(f"Top-level imports: {TOP_LEVEL_IMPORTS}")
+    lines.append(f"Total import time: {total / 1000:.1f} ms")
+    lines.append(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in rows:
+        lines.append(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    timings, loaded = idle_page_load()
+    lines.append("")
+    lines.append("Idle page load (AppTest, no click): " + ", ".join(f"{t * 1000:.0f} ms" for t in timings))
+    lines.append("Heavy modules imported before Calculate: " + (", ".join(loaded) if loaded else "none"))
+
+    report = "\n".join(lines)
+    print(report)
+    if "--write" in sys.argv:
+        with open(REPORT, "w") as f:
+            f.write(report + "\n")
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for Nominatim and the Open-Meteo archive / air-quality APIs.
+
+Benchmarks and load tests run fully offline against this server:
+
+- /search answers geocoding queries for the cities in fixtures/cities.json
+- /v1/archive and /v1/air-quality replay recorded Open-Meteo series from
+  fixtures/openmeteo/<city>_archive.json and <city>_air_quality.json, sliced
+  to the requested start_date/end_date and variables; like the real archive,
+  end dates less than ARCHIVE_DELAY_DAYS ago are answered 400
+
+Cities without a recording get a deterministic synthetic series (seasonal by
+latitude), so the stages still exercise the same code paths. Record real
+series once, with network access, using:
+
+    python benchmarks/stub_upstream.py record --start 2015-01-01 --end 2025-12-31
+
+Serve on its own (e.g. for the Streamlit app):
+
+    python benchmarks/stub_upstream.py serve --port 8765 --latency 0.05 --error-rate 0.01
+
+and point the app at it with the environment variables printed at startup.
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import math
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CITIES_FILE = os.path.join(FIXTURES, "cities.json")
+RECORD_DIR = os.path.join(FIXTURES, "openmeteo")
+
+DAILY_VARS = ["temperature_2m_max", "precipitation_sum", "cloud_cover_mean", "wind_speed_10m_max"]
+HOURLY_VARS = ["pm2_5", "ozone"]
+
+# A recording is used for requests within this many degrees of its city
+MATCH_DEG = 0.2
+
+# Like the real archive, days newer than this are not published yet and requests for them fail
+ARCHIVE_DELAY_DAYS = 5
+
+
+def load_cities():
+    with open(CITIES_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _slug(name):
+    return name.lower().replace(" ", "_")
+
+
+# ── Replay ────────────────────────────────────────────────────────────────────
+
+class Recordings:
+    def __init__(self, cities):
+        self.cities = cities
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def nearest_city(self, lat, lon):
+        best, best_d = None, MATCH_DEG
+        for name, c in self.cities.items():
+            d = max(abs(c["lat"] - lat), abs(c["lon"] - lon))
+            if d <= best_d:
+                best, best_d = name, d
+        return best
+
+    # Recorded {"time": [...], var: [...]} for a city and endpoint, or None
+    def series(self, city, kind):
+        key = (city, kind)
+        with self._lock:
+            if key not in self._series:
+                path = os.path.join(RECORD_DIR, f"{_slug(city)}_{kind}.json")
+                data = None
+                if os.path.exists(path):
+                    with open(path, encoding="utf-8") as f:
+                        data = json.load(f)
+                self._series[key] = data
+            return self._series[key]
+
+
+def _slice(series, start, end, variables):
+    times = series["time"]
+    lo = bisect.bisect_left(times, start)
+    hi = bisect.bisect_right(times, end)
+    out = {"time": times[lo:hi]}
+    for var in variables:
+        if var in series:
+            out[var] = series[var][lo:hi]
+    return out
+
+
+def _dates(start, end):
+    d0, d1 = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    return [d0 + datetime.timedelta(days=i) for i in range((d1 - d0).days + 1)]
+
+
+def _rng(*key):
+    return random.Random(zlib.crc32(repr(key).encode()))
+
+
+# Deterministic made-up climate: warmer near the equator, seasons flipped in the south
+def synthetic_daily(lat, lon, start, end, variables):
+    days = _dates(start, end)
+    cols = {var: [] for var in DAILY_VARS}
+    for d in days:
+        r = _rng(round(lat, 1), round(lon, 1), d.isoformat())
+        season = math.cos(2 * math.pi * (d.timetuple().tm_yday - 200) / 365.25) * (1 if lat >= 0 else -1)
+        base = 28 - abs(lat) * 0.4
+        cols["temperature_2m_max"].append(round(base + season * abs(lat) * 0.25 + r.gauss(0, 3), 1))
+        cols["precipitation_sum"].append(round(max(0.0, r.gauss(0.5, 3)), 1))
+        cols["cloud_cover_mean"].append(round(r.random() * 100))
+        cols["wind_speed_10m_max"].append(round(abs(r.gauss(14, 7)), 1))
+    out = {"time": [d.isoformat() for d in days]}
+    out.update({var: cols[var] for var in variables if var in cols})
+    return out
+
+
+def synthetic_hourly(lat, lon, start, end, variables):
+    times, cols = [], {var: [] for var in HOURLY_VARS}
+    for d in _dates(start, end):
+        r = _rng("aq", round(lat, 1), round(lon, 1), d.isoformat())
+        haze = r.random() * 25
+        for h in range(24):
+            times.append(f"{d.isoformat()}T{h:02d}:00")
+            cols["pm2_5"].append(round(haze + r.random() * 5, 1))
+            cols["ozone"].append(round(220 + 120 * math.sin(math.pi * h / 24) + r.gauss(0, 15)))
+    out = {"time": times}
+    out.update({var: cols[var] for var in variables if var in cols})
+    return out
+
+
+# ── Server ────────────────────────────────────────────────────────────────────
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, StubHandler)
+        self.cities = load_cities()
+        self.recordings = Recordings(self.cities)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Environment variables that point the app at this server
+    def env(self):
+        return env(*self.server_address[:2])
+
+    def draw(self):
+        with self._random_lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return delay, fail
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        delay, fail = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send(503, {"error": True, "reason": "stub: injected failure"})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/search":
+            self._send(200, self._search(query))
+        elif url.path in ("/v1/archive", "/v1/air-quality"):
+            try:
+                self._send(200, self._open_meteo(url.path, query))
+            except (KeyError, ValueError) as e:
+                self._send(400, {"error": True, "reason": str(e)})
+        else:
+            self._send(404, {"error": True, "reason": "not found"})
+
+    def _search(self, query):
+        q = " ".join(query.get("q", [""])[0].casefold().split())
+        for name, c in self.server.cities.items():
+            if q == name.casefold() or q.split(",")[0].strip() == name.casefold():
+                return [{"lat": str(c["lat"]), "lon": str(c["lon"]), "display_name": c["display_name"]}]
+        return []
+
+    def _open_meteo(self, path, query):
+        lat, lon = float(query["latitude"][0]), float(query["longitude"][0])
+        start, end = query["start_date"][0], query["end_date"][0]
+        daily = path == "/v1/archive"
+        key = "daily" if daily else "hourly"
+        variables = [v for value in query.get(key, []) for v in value.split(",")]
+        newest = datetime.date.today() - datetime.timedelta(days=ARCHIVE_DELAY_DAYS)
+        if daily and datetime.date.fromisoformat(end) > newest:
+            raise ValueError(f"Parameter 'end_date' is out of allowed range from 1940-01-01 to {newest}")
+
+        city = self.server.recordings.nearest_city(lat, lon)
+        series = self.server.recordings.series(city, "archive" if daily else "air_quality") if city else None
+        if series is not None:
+            block = _slice(series, start if daily else start + "T00:00", end if daily else end + "T23:59", variables)
+        elif daily:
+            block = synthetic_daily(lat, lon, start, end, variables)
+        else:
+            block = synthetic_hourly(lat, lon, start, end, variables)
+        return {"latitude": lat, "longitude": lon, key: block}
+
+
+# Environment variables that point the app at a stand-in listening on host:port
+def env(host, port):
+    return {
+        "BRT_NOMINATIM_DOMAIN": f"{host}:{port}",
+        "BRT_NOMINATIM_SCHEME": "http",
+        "BRT_ARCHIVE_URL": f"http://{host}:{port}/v1/archive",
+        "BRT_AIR_QUALITY_URL": f"http://{host}:{port}/v1/air-quality",
+        # The stand-in has no usage policy, so requests are not rate limited
+        "BRT_NOMINATIM_RATE": "0",
+        "BRT_UPSTREAM_RATE": "0",
+    }
+
+
+def start(latency=0.0, jitter=0.0, error_rate=0.0, port=0, seed=0):
+    server = StubServer(("127.0.0.1", port), latency, jitter, error_rate, seed)
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server
+
+
+# ── Recording ─────────────────────────────────────────────────────────────────
+
+def record(start_date, end_date, names=None):
+    import requests
+
+    cities = load_cities()
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    for name in names or cities:
+        c = cities[name]
+        common = {"latitude": c["lat"], "longitude": c["lon"], "start_date": start_date,
+                  "end_date": end_date, "timezone": "auto"}
+        for kind, url, key, variables in [
+                ("archive", "https://archive-api.open-meteo.com/v1/archive", "daily", DAILY_VARS),
+                ("air_quality", "https://air-quality-api.open-meteo.com/v1/air-quality", "hourly", HOURLY_VARS)]:
+            res = requests.get(url, params=dict(common, **{key: variables}), timeout=120)
+            res.raise_for_status()
+            with open(os.path.join(RECORD_DIR, f"{_slug(name)}_{kind}.json"), "w", encoding="utf-8") as f:
+                json.dump(res.json()[key], f, separators=(",", ":"))
+            print(f"recorded {name} {kind}")
+            time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for Nominatim and Open-Meteo.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    serve.add_argument("--jitter", type=float, default=0.0, help="± seconds of random extra latency")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    rec = sub.add_parser("record")
+    rec.add_argument("--start", default="2015-01-01")
+    rec.add_argument("--end", default=(datetime.date.today() - datetime.timedelta(days=10)).isoformat())
+    rec.add_argument("--city", action="append", help="only these cities (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.start, args.end, args.city)
+        return
+    server = StubServer(("127.0.0.1", args.port), args.latency, args.jitter, args.error_rate)
+    for name, value in server.env().items():
+        print(f"export {name}={value}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Accuracy and speed of the precomputed twilight table against astral.
+
+Random (latitude, longitude, date) samples, with the local timezone
+approximated by longitude, are looked up in the table and computed exactly.
+Reports the error of f1, how often the table falls back, and any
+disagreement about white nights. Days astral rejects only because an event
+falls on the neighbouring local date are counted apart. The table must be
+built first (python twilight_table.py).
+
+    python benchmarks/twilight_accuracy.py --samples 20000 --max-lat 75
+
+The exit status is 1 when an error exceeds twilight_table.ERROR_BOUND or a
+white night is misclassified.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from astral import Observer  # noqa: E402
+from astral.sun import elevation, noon, sun  # noqa: E402
+
+import twilight_table  # noqa: E402
+
+
+def exact(lat, lon, d):
+    observer = Observer(lat, lon)
+    tz = datetime.timezone(datetime.timedelta(hours=round(lon / 15)))
+    try:
+        s = sun(observer, date=d, tzinfo=tz)
+    except Exception:
+        return None
+    return (s["dusk"] - s["sunset"]).total_seconds() / 60
+
+
+# astral also fails when an event falls on the neighbouring local date; a real
+# white night is one where the sun stays above dusk elevation at solar midnight
+def is_white_night(lat, lon, d):
+    observer = Observer(lat, lon)
+    midday = noon(observer, d)
+    night = elevation(observer, midday + datetime.timedelta(hours=12))
+    return night > -6 or elevation(observer, midday) < -0.833
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Twilight table accuracy against astral.")
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--max-lat", type=float, default=80.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if twilight_table.get_table() is None:
+        print(f"no table at {twilight_table.TABLE_PATH}; build it with python twilight_table.py")
+        return 1
+
+    rng = random.Random(args.seed)
+    start = datetime.date(2025, 1, 1)
+    samples = [(rng.uniform(-args.max_lat, args.max_lat), rng.uniform(-180, 180),
+                start + datetime.timedelta(days=rng.randrange(4 * 365)))
+               for _ in range(args.samples)]
+
+    errors = []
+    fallback = white_mismatch = astral_failures = 0
+    t_table = t_exact = 0.0
+    for lat, lon, d in samples:
+        t0 = time.perf_counter()
+        row = twilight_table.lookup(lat, [d])[0]
+        t1 = time.perf_counter()
+        ref = exact(lat, lon, d)
+        t2 = time.perf_counter()
+        t_table += t1 - t0
+        t_exact += t2 - t1
+
+        if np.isnan(row[twilight_table.WHITE_NIGHT]):
+            fallback += 1
+            continue
+        if ref is None and not is_white_night(lat, lon, d):
+            astral_failures += 1
+            continue
+        if (row[twilight_table.WHITE_NIGHT] == 1) != (ref is None):
+            white_mismatch += 1
+            continue
+        if ref is None:
+            continue
+        errors.append(abs(row[twilight_table.F1] - ref))
+
+    print(f"{args.samples} samples up to ±{args.max_lat}° latitude")
+    print(f"table lookup {t_table / args.samples * 1e6:8.1f} µs/day   exact {t_exact / args.samples * 1e6:8.1f} µs/day")
+    print(f"fallbacks {fallback} ({fallback / args.samples:.1%})   white-night mismatches {white_mismatch}   "
+          f"astral date-boundary failures {astral_failures}")
+    errors = np.array(errors)
+    worst = errors.max()
+    print(f"    f1 max {worst:6.3f} min   p99 {np.percentile(errors, 99):6.3f} min   mean {errors.mean():6.3f} min")
+    ok = worst <= twilight_table.ERROR_BOUND and white_mismatch == 0
+    print(f"\nwithin {twilight_table.ERROR_BOUND} min bound: {'yes' if ok else 'NO'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
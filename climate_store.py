@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local store for historical daily weather, one memory-mapped NumPy file per grid cell.
+
+Past weather never changes, so every day downloaded from Open-Meteo is kept.
+Each cell file is a float32 array with one row per day since EPOCH and one
+column per variable, plus a flag column that marks the days already
+fetched. Callers ask for the missing ranges, download only those, write them
+back, and copy every other day they need from disk straight into their own
+arrays.
+"""
+
+import datetime
+import os
+import threading
+
+import numpy as np
+
+import geo
+
+
+STORE_DIR = os.path.join(geo.CACHE_DIR, "climate")
+
+CELL_DEG = 0.1                       # about the resolution of the Open-Meteo archive
+EPOCH = datetime.date(1980, 1, 1)
+N_DAYS = (datetime.date(2050, 1, 1) - EPOCH).days
+
+# Days this recent may still be revised (or be missing) upstream, so they are never marked as stored
+STABLE_AFTER_DAYS = 7
+
+_lock = threading.Lock()
+
+
+def cell_of(lat, lon):
+    return round(lat / CELL_DEG), round(lon / CELL_DEG)
+
+
+# Coordinates used for every download of a cell, so all its days describe the same point
+def cell_center(cell):
+    return round(cell[0] * CELL_DEG, 4), round(cell[1] * CELL_DEG, 4)
+
+
+def _path(cell):
+    return os.path.join(STORE_DIR, f"{cell[0]}_{cell[1]}.npy")
+
+
+def _row(d):
+    return (d - EPOCH).days
+
+
+def _open(cell, n_columns, create=False):
+    path = _path(cell)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r+")
+    if not create:
+        return None
+    # Build the file under a temporary name so readers never see a half-written array
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(N_DAYS, n_columns + 1))
+    arr[:] = np.nan
+    arr[:, -1] = 0
+    arr.flush()
+    del arr
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r+")
+
+
+# Parts of the (start, end) ranges whose days are not stored yet
+def missing_ranges(cell, ranges, n_columns):
+    arr = _open(cell, n_columns)
+    if arr is None:
+        return list(ranges)
+
+    missing = []
+    for start, end in ranges:
+        stored = arr[_row(start):_row(end) + 1, -1] > 0
+        # Runs of unstored days: +1 where a run starts, -1 just after it ends
+        edges = np.diff(np.concatenate(([0], (~stored).astype(np.int8), [0])))
+        for run_start, run_end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            missing.append((start + datetime.timedelta(days=int(run_start)),
+                            start + datetime.timedelta(days=int(run_end) - 1)))
+    return missing
+
+
+# Store a block of consecutive days from start: values has one row per day and one
+# column per variable; only the rows marked in `present` are written
+def write(cell, start, values, present):
+    if not present.any():
+        return
+    first = _row(start)
+    rows = np.flatnonzero(present)
+    last_stable = _row(datetime.date.today() - datetime.timedelta(days=STABLE_AFTER_DAYS))
+
+    with _lock:
+        arr = _open(cell, values.shape[1], create=True)
+        arr[first + rows, :-1] = values[rows]
+        stable = rows[first + rows <= last_stable]
+        arr[first + stable, -1] = 1
+        arr.flush()
+
+
+# Copy the stored days from start into `out` (one row per day, one column per variable),
+# skipping the rows `present` already marks, and mark the copied rows in `present`
+def read_into(cell, start, out, present):
+    arr = _open(cell, out.shape[1])
+    if arr is None:
+        return
+    block = arr[_row(start):_row(start) + len(out)]
+    take = (block[:, -1] > 0) & ~present
+    out[take] = block[take, :-1]
+    present |= take
+
+
+# Delete the stored history of one cell, or of every cell
+def clear(cell=None):
+    with _lock:
+        if cell is not None:
+            paths = [_path(cell)]
+        elif os.path.isdir(STORE_DIR):
+            paths = [os.path.join(STORE_DIR, name) for name in os.listdir(STORE_DIR) if name.endswith(".npy")]
+        else:
+            paths = []
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
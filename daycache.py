@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-day memoization for the scoring pipeline.
+
+Moving the start date by one day leaves 29 of the 30 days unchanged, so the
+day-level results (twilight features, pink-time windows, weather scores) are
+kept per (rounded location, date). The pipeline looks the window up, computes
+only the missing days and stores them. Each cache is a bounded LRU, with an
+optional time-to-live for values that can still change.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import tracing
+
+
+# Nearby coordinates (about 1 km) share cached days
+def location_key(lat, lon):
+    return round(lat, 2), round(lon, 2)
+
+
+class DayCache:
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    # {date: value} for the dates that are cached (values may be None)
+    def get_many(self, location, dates):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for d in dates:
+                key = (location, d)
+                entry = self._items.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires is not None and expires < now:
+                    del self._items[key]
+                    continue
+                self._items.move_to_end(key)
+                found[d] = value
+        tracing.count(f"daycache.{self.name}.hit", len(found))
+        tracing.count(f"daycache.{self.name}.miss", len(dates) - len(found))
+        return found
+
+    # Store {date: value}; the least recently used days are evicted beyond maxsize
+    def put_many(self, location, values):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            for d, value in values.items():
+                key = (location, d)
+                self._items[key] = (expires, value)
+                self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
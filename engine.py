@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Romance-score pipeline, importable without Streamlit.
+
+Location and timezone, the twilight features f1-f3 for each day of a window,
+their normalised twilight score, the weather prediction and the combined
+romance score. rank_dates() runs all of it and returns the best dates with
+their twilight and pink time; iter_rank_dates() yields the same result stage
+by stage (twilight, weather as it arrives, pink time) for progressive
+display. Day-level results are memoized (daycache.py), so a window that
+overlaps a previous one only computes its new days. f1 comes from the
+precomputed twilight table when it has been built (twilight_table.py); the
+days it can't answer, and pink time, are computed for the whole window at
+once by the vectorized solar equations (solar.py).
+
+Used by the Streamlit app (FINAL_BRISHACK.py), batch_rank.py and the HTTP
+service in server.py.
+"""
+
+import datetime
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from astral import LocationInfo
+from astral.sun import sun
+from geopy.exc import GeopyError
+
+import astro
+import daycache
+import geo
+import ratelimit
+import singleflight
+import solar
+import tracing
+import twilight
+import twilight_table
+import weather
+
+
+_rank_flights = singleflight.group("rank_dates")
+# The stages of iter_rank_dates, which the app streams without a whole-call flight
+_twilight_flights = singleflight.group("twilight")
+_weather_flights = singleflight.group("weather_prediction")
+
+WEATHER_UNAVAILABLE = "Could not fetch weather data. Please try again."
+
+# Horizon of the "best dates this year" mode, and the fewest days between its dates
+YEAR_DAYS = 365
+MIN_GAP_DAYS = 7
+# Days that mode scores at a time; it never holds more than one block of the horizon
+BLOCK_DAYS = 30
+
+# Raw (f1, f2, f3) per day, None for white nights; astronomy never changes
+_feature_days = daycache.DayCache("features", maxsize=50_000)
+# (start, end) pink-time window per day, or None; room for prewarm.py's popular cities
+_pink_days = daycache.DayCache("pink_time", maxsize=50_000)
+# (weather_score, vibe) per day; only days whose every lookback year came from the climate
+# store are kept, as those don't change
+_weather_days = daycache.DayCache("weather", maxsize=50_000)
+
+
+# An upstream service failed (after retries) or has too many requests queued; the message
+# is for the user. A ValueError, so everything that shows ValueError messages shows these too.
+class ServiceUnavailable(ValueError):
+    pass
+
+
+# The span's city attribute is what prewarm.py counts to find the most requested cities
+def get_location(city_name):
+    with tracing.span("get_location", city=city_name):
+        try:
+            resolved = geo.resolve(city_name)
+        except ratelimit.UpstreamBusy as e:
+            raise ServiceUnavailable("Too many requests right now. Please try again in a minute.") from e
+        except GeopyError as e:
+            raise ServiceUnavailable("The city search service is unavailable. Please try again later.") from e
+        if resolved is None:
+            raise ValueError("City not found. Please enter a valid city name.")
+        lat, lon, timezone_str = resolved
+        tz = pytz.timezone(timezone_str)
+        city = LocationInfo(city_name, "", timezone_str, lat, lon)
+        return city, tz
+
+
+def get_sun_times(city, date_input, tz):
+    try:
+        s = sun(city.observer, date=date_input, tzinfo=tz)
+        return s["sunset"], s["dusk"]
+    except Exception:
+        return None, None
+
+
+@tracing.traced("thirty_days_values")
+def thirty_days_values(city, date_input, tz, days=30):
+    location = daycache.location_key(city.latitude, city.longitude)
+    window = astro.window_dates(date_input, days)
+    features = _feature_days.get_many(location, window)
+
+    missing = [d for d in window if d not in features]
+    if missing:
+        # f1 and white nights from the precomputed table where it can answer
+        table = twilight_table.lookup(city.latitude, missing)
+        computed = {}
+        if table is not None:
+            for i, m_date in enumerate(missing):
+                if table[i, twilight_table.WHITE_NIGHT] == 1:
+                    computed[m_date] = None
+                elif table[i, twilight_table.WHITE_NIGHT] == 0:
+                    computed[m_date] = float(table[i, twilight_table.F1])
+        # the rest from sunset and dusk of all those days in one vectorized call
+        rest = [d for d in missing if d not in computed]
+        if rest:
+            sunsets, dusks = solar.sunset_dusk(city.latitude, city.longitude, rest, solar.utc_offsets(rest, tz))
+            for m_date, f1 in zip(rest, (dusks - sunsets).filled(math.nan)):
+                computed[m_date] = None if math.isnan(f1) else float(f1)
+        valid = [d for d in missing if computed[d] is not None]
+        # f2 (moon) and f3 (sun distance) for every new valid day in one Skyfield call
+        f2, f3 = astro.sun_moon_features(valid)
+        for d, moon, distance in zip(valid, f2, f3):
+            computed[d] = (computed[d], float(moon), float(distance))
+        _feature_days.put_many(location, computed)
+        features.update(computed)
+
+    results = [{"date": d, "f1": features[d][0], "f2": features[d][1], "f3": features[d][2]}
+               for d in window if features[d] is not None]
+    skipped_days = days - len(results)
+    return pd.DataFrame(results, columns=["date", "f1", "f2", "f3"]), skipped_days
+
+
+# f1-f3 are normalised by their min and max over the frame, or by the given lows and
+# highs ({feature: value}) when the frame is only part of the horizon
+@tracing.traced("calculate_final_score")
+def calculate_final_score(df, lows=None, highs=None):
+    for col in ["f1", "f2", "f3"]:
+        low = df[col].min() if lows is None else lows[col]
+        high = df[col].max() if highs is None else highs[col]
+        df[col] = (df[col] - low) / (high - low)
+    df["twilight_score"] = df["f1"] * 0.55 + (1 - df["f2"]) * 0.35 + df["f3"] * 0.1
+    return df
+
+
+def get_romantic_weather_prediction(city_name, start_date, days=30):
+    df_weather = pd.DataFrame()
+    for df_weather, _ in iter_weather_prediction(city_name, start_date, days):
+        pass
+    return df_weather
+
+
+# Weather prediction as it arrives: yields (frame, (ranges_done, ranges_total)) each time
+# another lookback range is in, scored on the years received so far
+# Yields nothing when the city or all of its history can't be fetched
+# Concurrent calls for the same city and window share one stream; frames are read-only
+def iter_weather_prediction(city_name, start_date, days=30):
+    key = (geo.normalize_query(city_name), start_date, days)
+    return _weather_flights.stream(key, _iter_weather_prediction, city_name, start_date, days)
+
+
+# One weather_prediction span per lookback range, none open across a yield
+def _iter_weather_prediction(city_name, start_date, days):
+    location = geo.geocode(city_name)
+    if not location:
+        return
+
+    lat, lon = location
+    key = daycache.location_key(lat, lon)
+    window = astro.window_dates(start_date, days)
+    scores = _weather_days.get_many(key, window)
+
+    missing = [d for d in window if d not in scores]
+    if not missing:
+        yield _weather_frame(window, scores), (1, 1)
+        return
+
+    # Per-day climatology for the uncached span over the lookback years, one range request at a time
+    first, last = missing[0], missing[-1]
+    climatology = weather.iter_climatology(lat, lon, first, (last - first).days + 1)
+    while True:
+        with tracing.span("weather_prediction", city=city_name, days=days) as attributes:
+            step = next(climatology, None)
+            if step is None:
+                return
+            done, total, daily_avg, complete = step
+            attributes["ranges"] = f"{done}/{total}"
+            daily_avg = daily_avg.rename_axis("date").reset_index()
+            daily_avg["ideal_t"] = weather.ideal_temperature(lat, [d.month for d in daily_avg["date"]])
+            scored = weather.score_weather(daily_avg)
+            computed = dict(zip(daily_avg["date"], zip(scored["weather_score"], scored["vibe"])))
+            _weather_days.put_many(key, {d: computed[d] for d in daily_avg["date"][complete]})
+            frame = _weather_frame(window, {**scores, **computed})
+        yield frame, (done, total)
+        if done == total:
+            return
+
+
+def _weather_frame(window, scores):
+    rows = [(d,) + scores[d] for d in window if d in scores]
+    return pd.DataFrame(rows, columns=["date", "weather_score", "vibe"])
+
+
+# Join the weather prediction onto the twilight scores and combine them
+# Days without weather get a zero weather score and the default vibe
+def add_romance_score(df, df_weather):
+    df = pd.merge(df, df_weather[["date", "weather_score", "vibe"]], on="date", how="left")
+    df["weather_score"] = df["weather_score"].fillna(0)
+    df["vibe"]          = df["vibe"].fillna(weather.VIBE_EARTH)
+
+    df["romance_score"] = (df["twilight_score"] * 0.6 + df["weather_score"] * 0.4).round(4)
+    return df
+
+
+# Pink-time window for each date, solving only the days not cached yet
+# The band edges of all of them come from one vectorized solar.band_times() call
+def pink_time_windows(city, dates, tz):
+    location = daycache.location_key(city.latitude, city.longitude)
+    windows = _pink_days.get_many(location, dates)
+    missing = [d for d in dates if d not in windows]
+    if missing:
+        with tracing.span("pink_time", dates=len(missing)):
+            offsets = solar.utc_offsets(missing, tz)
+            starts, ends = solar.band_times(city.latitude, city.longitude, missing, twilight.PINK_TIME, offsets)
+            starts = solar.to_datetimes(missing, starts, tz, offsets)
+            ends = solar.to_datetimes(missing, ends, tz, offsets)
+            computed = {d: None if start is None else (start, end) for d, start, end in zip(missing, starts, ends)}
+        _pink_days.put_many(location, computed)
+        windows.update(computed)
+    return [windows[d] for d in dates]
+
+
+# Drop every memoized day (after changing the lookback or the scoring weights)
+def clear_day_caches():
+    for cache in (_feature_days, _pink_days, _weather_days):
+        cache.clear()
+
+
+# Full pipeline for one city: location, twilight features, weather, romance score,
+# and the best `top` dates with their civil twilight and pink time
+# Raises ValueError with a user-facing message when the city can't be scored, and its
+# subclass ServiceUnavailable when an upstream service fails.
+# Identical queries already in flight share one computation; treat the result as read-only.
+def rank_dates(city_name, start_date, days=30, top=3):
+    key = (geo.normalize_query(city_name), start_date, days, top)
+    with tracing.span("rank_dates", city=city_name, start=start_date, days=days):
+        return _rank_flights.do(key, _rank_dates, city_name, start_date, days, top)
+
+
+def _rank_dates(city_name, start_date, days, top):
+    for result in iter_rank_dates(city_name, start_date, days, top):
+        pass
+    return result
+
+
+# rank_dates() stage by stage, for progressive display. Each yield is a full result
+# with "stage" set to
+#   "twilight"  ranked on the twilight score alone (weather_score and vibe are None)
+#   "weather"   with the weather of the lookback years received so far ("weather_progress"
+#               is (ranges_done, ranges_total)); repeated as more arrive
+#   "complete"  the final ranking with pink time filled in
+# Pink time is None until the last stage. Raises ValueError like rank_dates().
+def iter_rank_dates(city_name, start_date, days=30, top=3):
+    city, tz = get_location(city_name)
+    df, skipped_days = twilight_scores(city_name, city, tz, start_date, days)
+
+    twilight_only = df.assign(romance_score=df["twilight_score"].round(4), weather_score=None, vibe=None)
+    yield _result(city_name, city, tz, skipped_days, twilight_only, top, "twilight")
+
+    scored = None
+    for df_weather, progress in iter_weather_prediction(city_name, start_date, days):
+        scored = add_romance_score(df, df_weather)
+        yield _result(city_name, city, tz, skipped_days, scored, top, "weather", progress)
+    if scored is None:
+        raise ServiceUnavailable(WEATHER_UNAVAILABLE)
+
+    yield _result(city_name, city, tz, skipped_days, scored, top, "complete", progress)
+
+
+# Twilight score of each valid day of the window: (frame, skipped_days)
+# Raises ValueError when too few days are valid. Concurrent calls for the same city
+# and window share one computation; treat the frame as read-only.
+def twilight_scores(city_name, city, tz, start_date, days=30):
+    key = (geo.normalize_query(city_name), start_date, days)
+    return _twilight_flights.do(key, _twilight_scores, city, tz, start_date, days)
+
+
+def _twilight_scores(city, tz, start_date, days):
+    df, skipped_days = thirty_days_values(city, start_date, tz, days)
+    _check_valid_days(len(df), skipped_days)
+    return calculate_final_score(df), skipped_days
+
+
+# Every stage at once, weather in one piece: (city, tz, df, skipped_days) with the
+# romance score of each valid day, unsorted. Raises ValueError like rank_dates().
+def score_window(city_name, start_date, days=30):
+    city, tz = get_location(city_name)
+    df, skipped_days = twilight_scores(city_name, city, tz, start_date, days)
+
+    df_weather = get_romantic_weather_prediction(city_name, start_date, days)
+    if df_weather.empty:
+        raise ServiceUnavailable(WEATHER_UNAVAILABLE)
+    return city, tz, add_romance_score(df, df_weather), skipped_days
+
+
+def _check_valid_days(valid_days, skipped_days):
+    if valid_days < 5:
+        message = "Too few valid days to generate recommendations."
+        if skipped_days > 0:
+            message += f" {skipped_days} day(s) skipped due to White Night conditions."
+        raise ValueError(message)
+
+
+# "Best dates this year": like rank_dates over a long horizon, with the weather from
+# climatology, and the best dates at least MIN_GAP_DAYS apart so they aren't one cluster
+# The horizon is scored BLOCK_DAYS at a time in two passes, so memory stays flat as it grows
+def best_dates(city_name, start_date, days=YEAR_DAYS, top=3):
+    key = ("best", geo.normalize_query(city_name), start_date, days, top)
+    with tracing.span("best_dates", city=city_name, start=start_date, days=days):
+        return _rank_flights.do(key, _best_dates, city_name, start_date, days, top)
+
+
+def _best_dates(city_name, start_date, days, top):
+    city, tz = get_location(city_name)
+    blocks = [(start_date + datetime.timedelta(days=i), min(BLOCK_DAYS, days - i))
+              for i in range(0, days, BLOCK_DAYS)]
+    weather.prefetch_history(city.latitude, city.longitude, start_date, days)
+
+    # First pass: the range of each twilight feature over the horizon, to normalise with
+    lows = dict.fromkeys(["f1", "f2", "f3"], math.inf)
+    highs = dict.fromkeys(["f1", "f2", "f3"], -math.inf)
+    valid_days = skipped_days = 0
+    for block_start, n in blocks:
+        df, skipped = thirty_days_values(city, block_start, tz, n)
+        valid_days += len(df)
+        skipped_days += skipped
+        if len(df):
+            for col in lows:
+                lows[col] = min(lows[col], df[col].min())
+                highs[col] = max(highs[col], df[col].max())
+    _check_valid_days(valid_days, skipped_days)
+
+    # Second pass: romance scores, keeping the best days top_spaced() can pick. Each pick rules
+    # out at most 2 * MIN_GAP_DAYS - 1 days, itself included, so they are all among these
+    keep = top * (2 * MIN_GAP_DAYS - 1)
+    heap = []
+    for block_start, n in blocks:
+        df, _ = thirty_days_values(city, block_start, tz, n)
+        if df.empty:
+            continue
+        df_weather = get_romantic_weather_prediction(city_name, block_start, n)
+        if df_weather.empty:
+            raise ServiceUnavailable(WEATHER_UNAVAILABLE)
+        scored = add_romance_score(calculate_final_score(df, lows, highs), df_weather)
+        for row in scored.itertuples(index=False):
+            # Ties go to the earlier day, as in top_spaced()
+            item = (np.nan_to_num(row.romance_score, nan=-np.inf), -row.date.toordinal(), row)
+            if len(heap) < keep:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+
+    candidates = pd.DataFrame([row for _, _, row in heap]).sort_values("date", ignore_index=True)
+    return _result(city_name, city, tz, skipped_days, top_spaced(candidates, top), top, "complete")
+
+
+# Rows of the `top` best days at least `gap` days apart: the best day, then the best
+# one at least `gap` days from it, and so on. One pass over the scores per pick, no sort
+def top_spaced(df, top, gap=MIN_GAP_DAYS):
+    scores = np.nan_to_num(df["romance_score"].to_numpy(dtype=np.float64), nan=-np.inf)
+    ordinals = np.array([d.toordinal() for d in df["date"]])
+    picks = []
+    for _ in range(min(top, len(scores))):
+        i = int(np.argmax(scores))
+        if scores[i] == -np.inf:
+            break
+        picks.append(i)
+        scores[np.abs(ordinals - ordinals[i]) < gap] = -np.inf
+    return df.iloc[picks]
+
+
+def _result(city_name, city, tz, skipped_days, df, top, stage, progress=None):
+    best = df.sort_values("romance_score", ascending=False).head(top)
+    if stage == "complete":
+        pink_windows = pink_time_windows(city, list(best["date"]), tz)
+    else:
+        pink_windows = [None] * len(best)
+
+    dates = []
+    for (_, row), pink in zip(best.iterrows(), pink_windows):
+        sunset, dusk = get_sun_times(city, row["date"], tz)
+        dates.append({
+            "date":           row["date"],
+            "romance_score":  row["romance_score"],
+            "twilight_score": row["twilight_score"],
+            "weather_score":  row["weather_score"],
+            "vibe":           row["vibe"],
+            "sunset":         sunset,
+            "dusk":           dusk,
+            "pink_start":     pink[0] if pink else None,
+            "pink_end":       pink[1] if pink else None,
+        })
+
+    return {
+        "city":             city_name,
+        "latitude":         city.latitude,
+        "longitude":        city.longitude,
+        "timezone":         city.timezone,
+        "skipped_days":     skipped_days,
+        "stage":            stage,
+        "weather_progress": progress,
+        "dates":            dates,
+    }
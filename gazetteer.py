@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional offline geocoder built from a GeoNames cities file.
+
+Download a GeoNames dump such as cities15000.zip from
+https://download.geonames.org/export/dump/, unzip it into the cache
+directory (or point BRT_GAZETTEER at the .txt file), and city names resolve
+locally in microseconds; geo.resolve() only goes to Nominatim for names not
+found here.
+
+The index is one sorted list of normalised names (both the local and the
+ASCII spelling of each city) with parallel arrays for coordinates,
+population and timezone. Exact lookups and prefix suggestions are binary
+searches on it; when several cities share a name the most populous wins,
+unless the query names a country ("Bristol, US").
+"""
+
+import bisect
+import functools
+import heapq
+import os
+import threading
+import unicodedata
+from array import array
+
+import geo
+
+
+GAZETTEER_PATH = os.environ.get("BRT_GAZETTEER", os.path.join(geo.CACHE_DIR, "cities15000.txt"))
+
+AUTOCOMPLETE_SIZE = 1000      # most populous cities offered by the app's city box, sent on every rerun
+
+# Common country names and abbreviations accepted after the comma besides ISO codes
+COUNTRY_ALIASES = {"uk": "GB", "england": "GB", "scotland": "GB", "wales": "GB", "usa": "US",
+                   "united kingdom": "GB", "united states": "US"}
+
+_lock = threading.Lock()
+_index = None
+_loaded = False
+_warm_lock = threading.Lock()
+_warm_thread = None
+
+
+# Lowercase, single spaces and no accents: "  São  Paulo" -> "sao paulo"
+def normalize(name):
+    decomposed = unicodedata.normalize("NFKD", geo.normalize_query(name))
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class Gazetteer:
+    def __init__(self, lines):
+        self.names = []
+        self.countries = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.population = array("q")
+        self.tz_ids = array("H")
+        self.timezones = []
+        tz_index = {}
+        entries = []
+
+        for line in lines:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 18:
+                continue
+            i = len(self.names)
+            self.names.append(fields[1])
+            self.countries.append(fields[8])
+            self.lat.append(float(fields[4]))
+            self.lon.append(float(fields[5]))
+            self.population.append(int(fields[14] or 0))
+            tz = fields[17]
+            if tz not in tz_index:
+                tz_index[tz] = len(self.timezones)
+                self.timezones.append(tz)
+            self.tz_ids.append(tz_index[tz])
+            for key in {normalize(fields[1]), normalize(fields[2])}:
+                entries.append((key, i))
+
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = array("i", [i for _, i in entries])
+
+    def __len__(self):
+        return len(self.names)
+
+    def label(self, i):
+        return f"{self.names[i]}, {self.countries[i]}"
+
+    def location(self, i):
+        return self.lat[i], self.lon[i], self.timezones[self.tz_ids[i]]
+
+    def _range(self, prefix, exact):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_right(self.keys, prefix) if exact else bisect.bisect_left(self.keys, prefix + "\uffff")
+        return lo, hi
+
+    # Index of the best city for "Name" or "Name, Country", or None
+    def find(self, query):
+        name, _, qualifier = query.partition(",")
+        country = None
+        if qualifier.strip():
+            qualifier = normalize(qualifier)
+            country = COUNTRY_ALIASES.get(qualifier, qualifier.upper() if len(qualifier) == 2 else None)
+            if country is None:
+                return None         # a region or country name we can't check; leave it to Nominatim
+        lo, hi = self._range(normalize(name), exact=True)
+        candidates = [self.ids[j] for j in range(lo, hi) if country is None or self.countries[self.ids[j]] == country]
+        if not candidates:
+            return None
+        return max(candidates, key=self.population.__getitem__)
+
+    # Up to `limit` cities whose name starts with the prefix, most populous first
+    def suggest(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        lo, hi = self._range(prefix, exact=False)
+        ids = {self.ids[j] for j in range(lo, hi)}
+        return heapq.nlargest(limit, ids, key=self.population.__getitem__)
+
+    # The n most populous cities
+    def popular(self, n):
+        return heapq.nlargest(n, range(len(self.names)), key=self.population.__getitem__)
+
+
+# The loaded gazetteer, or None when no cities file is installed
+def get_gazetteer():
+    global _index, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if os.path.exists(GAZETTEER_PATH):
+                    with open(GAZETTEER_PATH, encoding="utf-8") as f:
+                        _index = Gazetteer(f)
+                _loaded = True
+    return _index
+
+
+# Start loading the gazetteer in a daemon thread and return immediately
+def warm_up():
+    global _warm_thread
+    if _loaded:
+        return
+    with _warm_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=get_gazetteer, name="gazetteer-warm-up", daemon=True)
+            _warm_thread.start()
+
+
+# (lat, lon, timezone name) for a city, or None if it isn't in the gazetteer
+def resolve(query):
+    index = get_gazetteer()
+    if index is None:
+        return None
+    i = index.find(query)
+    return None if i is None else index.location(i)
+
+
+# [{"label", "latitude", "longitude", "timezone", "population"}] for names starting with prefix
+def suggest(prefix, limit=8):
+    index = get_gazetteer()
+    if index is None:
+        return []
+    suggestions = []
+    for i in index.suggest(prefix, limit):
+        lat, lon, tz = index.location(i)
+        suggestions.append({"label": index.label(i), "latitude": lat, "longitude": lon,
+                            "timezone": tz, "population": index.population[i]})
+    return suggestions
+
+
+# "Name, CC" labels of the most populous cities, for autocomplete; [] without a gazetteer
+# Computed once: the app asks on every rerun
+@functools.lru_cache(maxsize=4)
+def popular_labels(n=AUTOCOMPLETE_SIZE):
+    index = get_gazetteer()
+    if index is None:
+        return []
+    return [index.label(i) for i in index.popular(n)]
+
+
+# popular_labels() once the gazetteer is loaded; until then [] without waiting, and
+# the load is started in the background. Parsing the file takes seconds, too long
+# for a page load.
+def ready_labels(n=AUTOCOMPLETE_SIZE):
+    if not _loaded:
+        warm_up()
+        return []
+    return popular_labels(n)
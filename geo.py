@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geocoding and timezone lookup shared by the whole app.
+
+City names are resolved to (lat, lon, timezone) through a small in-memory
+LRU, the optional offline gazetteer (gazetteer.py) and a SQLite file that
+survives restarts. Only misses in all three go to Nominatim, at most one
+request per second for the whole process (ratelimit.py), and concurrent
+misses for the same city share one request (singleflight.py). Entries expire
+after a TTL; unknown cities are remembered for a shorter time so typos
+don't hit the network on every click.
+
+geopy and timezonefinder are imported the first time they are needed.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import ratelimit
+import singleflight
+import tracing
+
+
+CACHE_DIR = os.environ.get("BRT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+DB_PATH = os.path.join(CACHE_DIR, "geocode.sqlite3")
+
+TTL = 30 * 24 * 3600          # found cities: 30 days
+MISS_TTL = 24 * 3600          # unknown cities: 1 day
+LRU_SIZE = 1024
+
+USER_AGENT = "big_ring_theory"
+NOMINATIM_DOMAIN = os.environ.get("BRT_NOMINATIM_DOMAIN", "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.environ.get("BRT_NOMINATIM_SCHEME", "https")
+
+_lock = threading.Lock()
+_lru = OrderedDict()
+_db = None
+_geolocator = None
+_tf = None
+_flights = singleflight.group("geocode")
+
+
+# Same key for "Bristol", " bristol " and "BRISTOL"
+def normalize_query(query):
+    return " ".join(query.casefold().split())
+
+
+def _get_db():
+    global _db
+    if _db is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _db = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _db.execute("""CREATE TABLE IF NOT EXISTS geocode (
+                           query TEXT PRIMARY KEY,
+                           lat REAL, lon REAL, timezone TEXT,
+                           expires REAL NOT NULL)""")
+        _db.commit()
+    return _db
+
+
+def _get_geolocator():
+    global _geolocator
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        _geolocator = Nominatim(user_agent=USER_AGENT, domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
+    return _geolocator
+
+
+# TimezoneFinder loads its polygon data once and is reused for every lookup
+def get_timezone_finder():
+    global _tf
+    with _lock:
+        if _tf is None:
+            from timezonefinder import TimezoneFinder
+            _tf = TimezoneFinder()
+    return _tf
+
+
+def timezone_at(lat, lon):
+    return get_timezone_finder().timezone_at(lat=lat, lng=lon)
+
+
+# One Nominatim lookup; rate limiting and server errors are raised as ratelimit.Retryable
+def _nominatim_once(city_name):
+    from geopy.exc import GeocoderRateLimited, GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable
+
+    try:
+        return _get_geolocator().geocode(city_name)
+    except GeocoderRateLimited as e:
+        raise ratelimit.Retryable(e, e.retry_after)
+    except (GeocoderTimedOut, GeocoderUnavailable) as e:
+        raise ratelimit.Retryable(e)
+    except GeocoderServiceError as e:
+        # geopy raises the base class for other 5xx answers; bad queries and auth errors are subclasses
+        if type(e) is GeocoderServiceError:
+            raise ratelimit.Retryable(e)
+        raise
+
+
+def _lru_get(key, now):
+    with _lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < now:
+            del _lru[key]
+            return False, None
+        _lru.move_to_end(key)
+        return True, value
+
+
+def _lru_put(key, value, expires):
+    with _lock:
+        _lru[key] = (expires, value)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def _db_get(key, now):
+    with _lock:
+        row = _get_db().execute(
+            "SELECT lat, lon, timezone, expires FROM geocode WHERE query = ?", (key,)).fetchone()
+    if row is None or row[3] < now:
+        return False, None
+    lat, lon, timezone_str, expires = row
+    value = None if lat is None else (lat, lon, timezone_str)
+    _lru_put(key, value, expires)
+    return True, value
+
+
+def _db_put(key, value, expires):
+    lat, lon, timezone_str = value if value is not None else (None, None, None)
+    with _lock:
+        db = _get_db()
+        db.execute("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                   (key, lat, lon, timezone_str, expires))
+        db.commit()
+
+
+# (lat, lon, timezone name) for a city, or None if Nominatim doesn't know it
+def resolve(city_name):
+    key = normalize_query(city_name)
+    now = time.time()
+
+    hit, value = _lru_get(key, now)
+    if hit:
+        tracing.count("geocode.memory_hit")
+        return value
+
+    # The offline gazetteer, when installed, answers most cities without the network
+    import gazetteer    # imports geo, so not at module level
+    value = gazetteer.resolve(city_name)
+    if value is not None:
+        tracing.count("geocode.gazetteer_hit")
+        _lru_put(key, value, now + TTL)
+        return value
+
+    hit, value = _db_get(key, now)
+    if hit:
+        tracing.count("geocode.disk_hit")
+        return value
+
+    return _flights.do(key, _fetch, key, city_name)
+
+
+# Nominatim lookup for a miss, stored in both caches
+def _fetch(key, city_name):
+    # Stored by a flight for this key that finished after the caller looked
+    now = time.time()
+    hit, value = _lru_get(key, now)
+    if hit:
+        tracing.count("geocode.memory_hit")
+        return value
+
+    tracing.count("geocode.miss")
+    with tracing.span("nominatim.geocode", query=key):
+        location = ratelimit.limiter("nominatim").call(_nominatim_once, city_name)
+    if location is None:
+        value, expires = None, now + MISS_TTL
+    else:
+        lat, lon = location.latitude, location.longitude
+        value, expires = (lat, lon, timezone_at(lat, lon)), now + TTL
+
+    _lru_put(key, value, expires)
+    _db_put(key, value, expires)
+    return value
+
+
+# (lat, lon) for a city, or None
+def geocode(city_name):
+    value = resolve(city_name)
+    return None if value is None else value[:2]
+
+
+# Forget everything in memory (the SQLite store is kept)
+def clear_memory_cache():
+    with _lock:
+        _lru.clear()
+
+
+# Forget everything, in memory and on disk
+def clear_cache():
+    with _lock:
+        _lru.clear()
+        db = _get_db()
+        db.execute("DELETE FROM geocode")
+        db.commit()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prewarm the caches for popular cities before users ask for them.
+
+For each city this resolves the location and timezone, computes the
+day-level astronomy features and pink-time windows, and downloads and scores
+the weather climatology for every day a user can pick: start dates up to 90
+days ahead (the app's date picker) plus a 30-day window, so HORIZON_DAYS
+from today.
+
+    python prewarm.py cities.txt
+    python prewarm.py --from-log /var/log/brt/trace.log --top 300
+    python prewarm.py --popular 500 --rate 0.5
+
+Geocodes (geo.py's SQLite file) and weather history (climate_store) are
+written to disk and help every process. Astronomy, pink time and weather
+scores live in the pipeline's in-memory day caches, so they only help the
+process that ran the prewarm: set BRT_PREWARM_CITIES to a cities file and
+server.py prewarms itself at startup and again every night at PREWARM_AT.
+
+Cities go through one at a time per worker, at most `rate` per second, on
+top of the per-upstream limits in ratelimit.py. Progress is checkpointed to
+STATE_PATH after every city, so an interrupted run started again for the
+same day skips the cities already done.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import batch_rank
+import geo
+import ratelimit
+
+
+HORIZON_DAYS = 90 + 30
+STATE_PATH = os.path.join(geo.CACHE_DIR, "prewarm_state.json")
+PREWARM_AT = datetime.time(3, 0)         # local time of the nightly run in server.py
+
+DEFAULT_RATE = 0.2                       # cities per second
+DEFAULT_WORKERS = 2
+
+
+# The n most requested cities in a trace log (JSON or OTLP records), most requested first
+# Every pipeline run logs one get_location span with the city as typed
+def top_cities(log_path, n):
+    counts = Counter()
+    spelling = {}
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("name") != "get_location":
+                continue
+            attributes = record.get("attributes") or {}
+            if isinstance(attributes, list):      # OTLP: [{"key", "value": {"stringValue"}}]
+                attributes = {a.get("key"): (a.get("value") or {}).get("stringValue") for a in attributes}
+            city = attributes.get("city")
+            failed = record.get("error") or (record.get("status") or {}).get("code") == 2
+            if not city or failed:
+                continue
+            key = geo.normalize_query(city)
+            counts[key] += 1
+            spelling.setdefault(key, city.strip())
+    return [spelling[key] for key, _ in counts.most_common(n)]
+
+
+# Every cache the pipeline reads for one city over `days` days from start
+def prewarm_city(city_name, start, days=HORIZON_DAYS):
+    import astro
+    import engine
+
+    city, tz = engine.get_location(city_name)
+    engine.thirty_days_values(city, start, tz, days)
+    engine.pink_time_windows(city, astro.window_dates(start, days), tz)
+    if engine.get_romantic_weather_prediction(city_name, start, days).empty:
+        raise ValueError("Could not fetch weather data.")
+
+
+# Cities already done by an earlier run for the same start and horizon
+def _load_state(start, days):
+    try:
+        with open(STATE_PATH, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if state.get("start") != start.isoformat() or state.get("days") != days:
+        return set()
+    return set(state.get("done", []))
+
+
+def _save_state(start, days, done):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = f"{STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"start": start.isoformat(), "days": days, "done": sorted(done)}, f)
+    os.replace(tmp, STATE_PATH)
+
+
+# Prewarm a list of cities; returns (done, skipped, failed) counts
+# restart=True ignores the checkpoint of an earlier run
+def run(cities, start=None, days=HORIZON_DAYS, rate=DEFAULT_RATE, workers=DEFAULT_WORKERS,
+        restart=False, log=print):
+    import astro
+
+    start = start or datetime.date.today()
+    done = set() if restart else _load_state(start, days)
+    unique = {}
+    for city in cities:
+        unique.setdefault(geo.normalize_query(city), city)
+    todo = [city for key, city in unique.items() if key not in done]
+    skipped = len(unique) - len(todo)
+    if skipped:
+        log(f"{skipped} cities already prewarmed for {start}, resuming")
+
+    astro.warm_up(background=False)
+    limiter = ratelimit.Limiter("prewarm", rate=rate, burst=1, max_concurrent=workers,
+                                max_waiting=max(len(todo), 1))
+
+    def warm(city_name):
+        with limiter.slot():
+            t0 = time.perf_counter()
+            prewarm_city(city_name, start, days)
+            return time.perf_counter() - t0
+
+    n_done = n_failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="brt-prewarm") as pool:
+        futures = {pool.submit(warm, city): city for city in todo}
+        for i, future in enumerate(as_completed(futures), start=1):
+            city = futures[future]
+            try:
+                seconds = future.result()
+            except Exception as e:
+                n_failed += 1
+                log(f"[{i}/{len(todo)}] {city}: {e}")
+                continue
+            n_done += 1
+            done.add(geo.normalize_query(city))
+            _save_state(start, days, done)
+            log(f"[{i}/{len(todo)}] {city}: {seconds:.1f} s")
+    return n_done, skipped, n_failed
+
+
+# Seconds from now until the next `at` (local time)
+def _seconds_until(at):
+    now = datetime.datetime.now()
+    target = datetime.datetime.combine(now.date(), at)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+# Prewarm now and then every night at `at`, in a daemon thread of this process
+# The cities file is read again before each run. The checkpoint is ignored: another
+# process having warmed a city doesn't fill this one's memory
+def start_nightly(cities_path, at=PREWARM_AT, **kwargs):
+    kwargs.setdefault("restart", True)
+
+    def loop():
+        while True:
+            try:
+                run(batch_rank.read_cities(cities_path), **kwargs)
+            except Exception as e:
+                print(f"Prewarm failed: {e}", file=sys.stderr)
+            time.sleep(_seconds_until(at))
+
+    thread = threading.Thread(target=loop, name="brt-prewarm-nightly", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prewarm the caches for popular cities.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("cities", nargs="?", help="file with one city per line")
+    source.add_argument("--from-log", metavar="PATH", help="take the most requested cities from a trace log")
+    source.add_argument("--popular", type=int, metavar="N", help="the N most populous cities of the gazetteer")
+    parser.add_argument("--top", type=int, default=300, help="cities taken from the log (default 300)")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="first day to prewarm (YYYY-MM-DD, default today)")
+    parser.add_argument("--days", type=int, default=HORIZON_DAYS, help=f"days to prewarm (default {HORIZON_DAYS})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="cities started per second")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="cities prewarmed at once")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an earlier run")
+    args = parser.parse_args(argv)
+    if args.days < 1:
+        parser.error("--days must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.from_log:
+        cities = top_cities(args.from_log, args.top)
+    elif args.popular:
+        import gazetteer
+        cities = gazetteer.popular_labels(args.popular)
+    else:
+        cities = batch_rank.read_cities(args.cities)
+
+    done, skipped, failed = run(cities, args.start, args.days, args.rate, args.workers, args.restart)
+    print(f"{done} cities prewarmed, {skipped} already warm, {failed} failed")
+    return 0 if done or skipped or not cities else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
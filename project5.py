@@ -13,8 +13,9 @@ from astral.sun import sun, elevation
 from geopy.geocoders import Nominatim
 from timezonefinder import TimezoneFinder
 
-from skyfield.api import load, utc
+from skyfield.api import utc
 
+import astro
 
 
 # Function to get location and timezone
@@ -71,12 +72,12 @@ def moon_illuminated_fraction(date_input):
 # Feature 3 - Distance between Sun and Earth
 # A greater distance can lead to a more intense pink time due to less atmospheric scattering of sunlight
 def sun_earth_distance(date_input):
-    # load astronomical data (ephemeris))
-    planets = load('de421.bsp')
+    # astronomical data (ephemeris), loaded once per process
+    planets = astro.get_ephemeris()
     earth, sun = planets['earth'], planets['sun']
     # datetime including timezone information
     date = datetime.datetime(date_input.year, date_input.month, date_input.day, tzinfo=utc)
-    ts = load.timescale()
+    ts = astro.get_timescale()
     t = ts.from_datetime(date)
     # calculation of distance
     astrometric = earth.at(t).observe(sun)
@@ -124,6 +125,9 @@ def calculate_final_score(df):
 
 
 #Streamlit App
+# Load the ephemeris in the background before the first click
+astro.warm_up()
+
 # App title
 st.title("Big Ring Theory")
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide rate limiting and retries for calls to upstream services.
+
+Each upstream (Nominatim, each Open-Meteo host) has one Limiter shared by
+every session and thread:
+
+- a token bucket caps the request rate, allowing short bursts
+- a semaphore caps the requests in flight at once
+- callers queue for a slot; once too many are waiting, new ones fail fast
+  with UpstreamBusy instead of piling up behind a slow service
+
+call() runs a function inside a slot and, when it raises Retryable (429,
+5xx, timeouts), tries again after a jittered exponential backoff, honouring
+Retry-After (up to BACKOFF_MAX) when the service sends one.
+"""
+
+import contextlib
+import os
+import random
+import threading
+import time
+
+import tracing
+
+
+# Per-upstream limits; anything not listed gets DEFAULT_LIMITS
+DEFAULT_LIMITS = {"rate": float(os.environ.get("BRT_UPSTREAM_RATE", 10.0)), "burst": 20,
+                  "max_concurrent": 8, "max_waiting": 256}
+LIMITS = {
+    # Nominatim usage policy: at most one request per second, no parallel requests
+    "nominatim": {"rate": float(os.environ.get("BRT_NOMINATIM_RATE", 1.0)), "burst": 1,
+                  "max_concurrent": 1, "max_waiting": 32},
+}
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5       # seconds before the first retry, doubled each time (with full jitter)
+BACKOFF_MAX = 8.0
+
+_registry_lock = threading.Lock()
+_limiters = {}
+
+
+class UpstreamBusy(RuntimeError):
+    pass
+
+
+# Raised by an attempt that may succeed if repeated; cause is re-raised when retries run out
+class Retryable(Exception):
+    def __init__(self, cause, retry_after=None):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.retry_after = retry_after
+
+
+class Limiter:
+    def __init__(self, name, rate, burst, max_concurrent, max_waiting):
+        self.name = name
+        self.rate = rate             # requests per second; 0 or None for no limit
+        self.burst = burst
+        self.max_waiting = max_waiting
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self.waiting = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _take_token(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    # Block until both a concurrency slot and a token are available
+    @contextlib.contextmanager
+    def slot(self):
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise UpstreamBusy(f"Too many requests queued for {self.name}.")
+            self.waiting += 1
+        try:
+            self._slots.acquire()
+            try:
+                self._take_token()
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    # fn(*args) in a slot, retried with backoff while it raises Retryable
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with self.slot():
+                    return fn(*args, **kwargs)
+            except Retryable as e:
+                if attempt == MAX_RETRIES:
+                    raise e.cause
+                with self._lock:
+                    self.retries += 1
+                tracing.count(f"upstream.{self.name}.retry")
+                time.sleep(backoff(attempt, e.retry_after))
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "retries": self.retries, "rejected": self.rejected,
+                    "in_flight": self.in_flight, "waiting": self.waiting}
+
+
+# Full-jitter exponential backoff, never shorter than the service's Retry-After
+def backoff(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, min(float(retry_after), BACKOFF_MAX))
+    return delay
+
+
+# The process-wide limiter with this name, created on first use
+def limiter(name):
+    with _registry_lock:
+        if name not in _limiters:
+            _limiters[name] = Limiter(name, **LIMITS.get(name, DEFAULT_LIMITS))
+        return _limiters[name]
+
+
+# {limiter name: {"requests", "retries", "rejected", "in_flight", "waiting"}} for every limiter
+def stats():
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {lim.name: lim.stats() for lim in limiters}
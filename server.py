@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Small JSON HTTP service on top of engine.rank_dates and engine.best_dates, for the mobile front end.
+
+It is a plain ASGI app, so any ASGI server can run it:
+
+    uvicorn server:app --host 0.0.0.0 --port 8000
+    python server.py --port 8000
+
+The process stays up between requests, so the ephemeris, the TimezoneFinder
+polygons and the geocode/weather caches loaded by the first request (or by
+the startup warm-up) stay warm for every later one. With BRT_PREWARM_CITIES
+set to a cities file, the caches for those cities are also filled at
+startup and every night (prewarm.py).
+
+    GET /rank?city=Bristol&start=2026-05-01&days=30&top=3
+    GET /best?city=Bristol&start=2026-05-01&days=365&top=3   (dates at least a week apart)
+    GET /suggest?q=bri&limit=8                               (needs the offline gazetteer)
+    GET /health
+    GET /metrics      (request coalescing and upstream rate-limit counters)
+
+/rank and /best answer 400 for bad parameters, 422 when the city can't be
+scored and 503 when geocoding or weather is unavailable, with the message
+in "error".
+"""
+
+import asyncio
+import datetime
+import json
+import os
+from urllib.parse import parse_qs
+
+import astro
+import engine
+import gazetteer
+import geo
+import prewarm
+import ratelimit
+import singleflight
+
+
+MAX_DAYS = 366
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if hasattr(value, "item"):          # NumPy scalars
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def _send_json(send, status, body):
+    payload = json.dumps(body, default=_json_default, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                            (b"content-length", str(len(payload)).encode())]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+# Load everything the first request would otherwise pay for
+def warm_up():
+    astro.warm_up(background=False)
+    geo.get_timezone_finder()
+    gazetteer.get_gazetteer()
+    if os.environ.get("BRT_PREWARM_CITIES"):
+        prewarm.start_nightly(os.environ["BRT_PREWARM_CITIES"])
+
+
+def _rank_params(query, default_days=30):
+    params = {k: v[0] for k, v in parse_qs(query).items()}
+    city = params.get("city", "").strip()
+    if not city:
+        raise ValueError("Missing 'city' parameter.")
+    try:
+        start = datetime.date.fromisoformat(params["start"]) if "start" in params else datetime.date.today()
+        days = int(params.get("days", default_days))
+        top = int(params.get("top", 3))
+    except ValueError:
+        raise ValueError("Invalid 'start', 'days' or 'top' parameter.")
+    if not 1 <= days <= MAX_DAYS or top < 1:
+        raise ValueError(f"'days' must be between 1 and {MAX_DAYS} and 'top' at least 1.")
+    return city, start, days, top
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.to_thread(warm_up)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    if scope["method"] != "GET":
+        await _send_json(send, 405, {"error": "Only GET is supported."})
+        return
+
+    path = scope["path"]
+    if path == "/health":
+        await _send_json(send, 200, {"status": "ok"})
+    elif path == "/metrics":
+        await _send_json(send, 200, {"singleflight": singleflight.stats(), "upstream": ratelimit.stats()})
+    elif path == "/suggest":
+        params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        try:
+            limit = min(int(params.get("limit", 8)), 50)
+        except ValueError:
+            await _send_json(send, 400, {"error": "Invalid 'limit' parameter."})
+            return
+        await _send_json(send, 200, {"suggestions": gazetteer.suggest(params.get("q", ""), limit)})
+    elif path in ("/rank", "/best"):
+        ranker, default_days = (engine.rank_dates, 30) if path == "/rank" else (engine.best_dates, engine.YEAR_DAYS)
+        try:
+            city, start, days, top = _rank_params(scope.get("query_string", b"").decode("latin-1"), default_days)
+        except ValueError as e:
+            await _send_json(send, 400, {"error": str(e)})
+            return
+        # The pipeline is blocking, so it runs in a worker thread and the event loop stays free
+        try:
+            result = await asyncio.to_thread(ranker, city, start, days, top)
+        except engine.ServiceUnavailable as e:
+            await _send_json(send, 503, {"error": str(e)})
+            return
+        except ValueError as e:
+            await _send_json(send, 422, {"error": str(e)})
+            return
+        await _send_json(send, 200, result)
+    else:
+        await _send_json(send, 404, {"error": "Not found."})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve romance-score rankings over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request coalescing ("single flight") for identical in-flight calls.
+
+When several threads ask for the same key at the same time, only the first
+one runs the function; the others wait for it and get the same result (or
+the same exception). Results are shared, not copied, so callers must treat
+them as read-only. Nothing is cached once the call has finished.
+
+stream() does the same for generators: callers that join a stream already
+running get every item the first caller's generator has produced so far,
+then each new one as it arrives. If the first caller stops iterating
+early, the others carry on with a fresh run of the generator.
+
+Each Group counts how many calls it executed and how many it deduplicated;
+stats() reports every group by name.
+"""
+
+import threading
+
+
+_registry_lock = threading.Lock()
+_groups = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    def __init__(self):
+        self.changed = threading.Condition()
+        self.items = []
+        self.done = False
+        self.error = None
+        self.abandoned = False
+
+
+class Group:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    # fn(*args, **kwargs), shared with every concurrent caller using the same key
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    # The items of fn(*args, **kwargs), a generator, shared with every concurrent caller
+    # iterating the same key; use keys distinct from those passed to do()
+    def stream(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Stream()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+
+        if leader:
+            yield from self._lead(key, call, fn(*args, **kwargs))
+            return
+
+        i = 0
+        while True:
+            with call.changed:
+                while i == len(call.items) and not call.done:
+                    call.changed.wait()
+                if i < len(call.items):
+                    item = call.items[i]
+                elif call.error is not None:
+                    raise call.error
+                elif call.abandoned:
+                    break
+                else:
+                    return
+            i += 1
+            yield item
+        # The leader stopped iterating before the end: start over, in a stream of our own
+        # or one joined (the items seen so far come again)
+        yield from self.stream(key, fn, *args, **kwargs)
+
+    def _lead(self, key, call, items):
+        finished = False
+        try:
+            for item in items:
+                with call.changed:
+                    call.items.append(item)
+                    call.changed.notify_all()
+                yield item
+            finished = True
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            with call.changed:
+                call.done = True
+                call.abandoned = not finished and call.error is None
+                call.changed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "deduplicated": self.deduplicated,
+                    "in_flight": len(self._calls)}
+
+
+# The process-wide group with this name, created on first use
+def group(name):
+    with _registry_lock:
+        if name not in _groups:
+            _groups[name] = Group(name)
+        return _groups[name]
+
+
+# {group name: {"executed", "deduplicated", "in_flight"}} for every group
+def stats():
+    with _registry_lock:
+        groups = list(_groups.values())
+    return {g.name: g.stats() for g in groups}
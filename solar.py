@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized NOAA solar equations for evening events over arrays of dates.
+
+The same equations astral uses (declination and equation of time from the
+NOAA spreadsheet, two refinement passes of the hour angle), written with
+NumPy, so sunset, civil dusk and the pink-band crossings of a whole window,
+or of many locations at once, take one call instead of a Python loop over
+astral.
+
+Latitude, longitude, dates and UTC offsets broadcast against each other.
+Times come back as local minutes after midnight of each date, in a masked
+array: days on which the sun never reaches the elevation (white nights,
+polar day and night) are masked instead of raising. Like astral, an event
+that falls on the neighbouring local date is looked up on the adjacent day
+first, and masked if it still isn't on the requested date.
+
+benchmarks/solar_accuracy.py checks the results against astral.
+"""
+
+import datetime
+import functools
+import math
+
+import numpy as np
+
+
+SUN_APPARENT_RADIUS = 32.0 / (60.0 * 2.0)
+SUNSET_ZENITH = 90.0 + SUN_APPARENT_RADIUS
+CIVIL_DUSK_ZENITH = 96.0
+
+ERROR_BOUND = 1.0        # minutes from astral, for sunset, dusk and band edges
+
+# Hour-angle passes for band edges: astral's two are off by minutes at high latitudes,
+# where twilight.py's root finding is the reference
+BAND_ITERATIONS = 4
+
+# Julian day at 00:00 UTC of date.toordinal() == 0
+_JD_ORDINAL = 1721424.5
+
+
+def _julian_days(dates):
+    return np.array([d.toordinal() for d in dates], dtype=np.float64) + _JD_ORDINAL
+
+
+def _declination_and_eqtime(jc):
+    l0 = (280.46646 + jc * (36000.76983 + 0.0003032 * jc)) % 360.0
+    m = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    e = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+    m_rad = np.radians(m)
+    c = (np.sin(m_rad) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+         + np.sin(2 * m_rad) * (0.019993 - 0.000101 * jc)
+         + np.sin(3 * m_rad) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = l0 + c - 0.00569 - 0.00478 * np.sin(omega)
+    seconds = 21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))
+    obliquity = 23.0 + (26.0 + seconds / 60.0) / 60.0 + 0.00256 * np.cos(omega)
+
+    declination = np.degrees(np.arcsin(np.sin(np.radians(obliquity)) * np.sin(np.radians(apparent_long))))
+
+    y = np.tan(np.radians(obliquity) / 2.0) ** 2
+    l0_rad = np.radians(l0)
+    eqtime = 4.0 * np.degrees(y * np.sin(2 * l0_rad) - 2.0 * e * np.sin(m_rad)
+                              + 4.0 * e * y * np.sin(m_rad) * np.cos(2 * l0_rad)
+                              - 0.5 * y * y * np.sin(4 * l0_rad) - 1.25 * e * e * np.sin(2 * m_rad))
+    return declination, eqtime
+
+
+# astral's refraction term for a zenith angle (degrees)
+def _refraction(zenith):
+    elevation = 90.0 - zenith
+    if elevation >= 85.0:
+        return 0.0
+    te = math.tan(math.radians(elevation))
+    if elevation > 5.0:
+        correction = 58.1 / te - 0.07 / te ** 3 + 0.000086 / te ** 5
+    elif elevation > -0.575:
+        correction = 1735.0 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))
+    else:
+        correction = -20.774 / te
+    return correction / 3600.0
+
+
+# Minutes after 00:00 UTC of each Julian day at which the setting sun reaches the zenith angle
+# NaN where it never does
+def _setting_minutes_utc(lat, lon, jd, zenith, iterations=2):
+    lat_rad = np.radians(np.clip(lat, -89.8, 89.8))
+    cos_zenith = np.cos(np.radians(zenith))
+    # astral's two passes start from 00:00 UTC; longer refinements start from local noon,
+    # which keeps grazing crossings near the polar circles from going out of domain
+    adjustment = 0.0 if iterations <= 2 else (720.0 - 4.0 * lon) / 1440.0
+    for _ in range(iterations):
+        jc = (jd + adjustment - 2451545.0) / 36525.0
+        declination, eqtime = _declination_and_eqtime(jc)
+        decl_rad = np.radians(declination)
+        h = (cos_zenith - np.sin(lat_rad) * np.sin(decl_rad)) / (np.cos(lat_rad) * np.cos(decl_rad))
+        with np.errstate(invalid="ignore"):
+            hour_angle = -np.arccos(h)
+        offset = (-lon - np.degrees(hour_angle)) * 4.0 - eqtime
+        offset = np.where(offset < -720.0, offset + 1440.0, offset)
+        minutes = 720.0 + offset
+        adjustment = minutes / 1440.0
+    return minutes
+
+
+# Local minutes after midnight at which the setting sun reaches each of the zenith angles,
+# stacked on a leading axis in front of the broadcast shape of lat, lon, dates and utc_offset
+def _setting_times(lat, lon, dates, zeniths, utc_offset, iterations):
+    shape = np.broadcast_shapes(np.shape(lat), np.shape(lon), (len(dates),), np.shape(utc_offset))
+    zeniths = np.reshape(np.asarray(zeniths, dtype=np.float64), (-1,) + (1,) * len(shape))
+    lat, lon, jd, utc_offset, zeniths = np.broadcast_arrays(
+        np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64), _julian_days(dates),
+        np.asarray(utc_offset, dtype=np.float64), zeniths)
+
+    local = _setting_minutes_utc(lat, lon, jd, zeniths, iterations) + utc_offset
+    # On the neighbouring local date: solve the adjacent UTC day instead, as astral does
+    for shift in (1.0, -1.0):
+        wrong = (local < 0) if shift > 0 else (local >= 1440)
+        if wrong.any():
+            retry = _setting_minutes_utc(lat[wrong], lon[wrong], jd[wrong] + shift, zeniths[wrong], iterations)
+            local[wrong] = retry + utc_offset[wrong] + 1440.0 * shift
+    return np.ma.masked_invalid(np.where((local >= 0) & (local < 1440), local, np.nan))
+
+
+# Local minutes after midnight at which the setting sun reaches the zenith angle, as a
+# masked array broadcast over lat, lon, dates and utc_offset (minutes east of UTC)
+# refraction=True adds astral's refraction term to the zenith, as astral's sunset() and dusk() do
+def setting_times(lat, lon, dates, zenith, utc_offset=0.0, refraction=True, iterations=2):
+    if refraction:
+        zenith += _refraction(zenith)
+    return _setting_times(lat, lon, dates, [zenith], utc_offset, iterations)[0]
+
+
+# Sunset and civil dusk, as setting_times() does
+def sunset_dusk(lat, lon, dates, utc_offset=0.0):
+    zeniths = [z + _refraction(z) for z in (SUNSET_ZENITH, CIVIL_DUSK_ZENITH)]
+    sunsets, dusks = _setting_times(lat, lon, dates, zeniths, utc_offset, 2)
+    return sunsets, dusks
+
+
+# True (geometric) elevation at which astral's refracted elevation equals `apparent`
+@functools.lru_cache(maxsize=64)
+def true_elevation(apparent):
+    lo, hi = apparent - 2.0, apparent + 2.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if mid + _refraction(90.0 - mid) < apparent:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+# Start and end of an evening elevation band (lower, upper) in apparent degrees, as
+# twilight.BANDS measures them with astral's elevation(): the sun crosses `upper` first
+# Like twilight.twilight_windows(), a day with either edge missing has no band: both are masked
+def band_times(lat, lon, dates, band, utc_offset=0.0):
+    lower, upper = band
+    zeniths = [90.0 - true_elevation(upper), 90.0 - true_elevation(lower)]
+    times = _setting_times(lat, lon, dates, zeniths, utc_offset, BAND_ITERATIONS)
+    missing = np.ma.getmaskarray(times).any(axis=0)
+    return np.ma.masked_where(missing, times[0]), np.ma.masked_where(missing, times[1])
+
+
+# Aware datetimes in tz for local minutes on each date, computed with these utc_offsets;
+# None where masked
+def to_datetimes(dates, minutes, tz, utc_offset):
+    values = np.ma.filled(np.ma.asarray(minutes, dtype=np.float64), np.nan)
+    offsets = np.broadcast_to(np.asarray(utc_offset, dtype=np.float64), values.shape)
+    out = []
+    for d, m, offset in zip(dates, values.tolist(), offsets.tolist()):
+        if math.isnan(m):
+            out.append(None)
+            continue
+        utc = datetime.datetime(d.year, d.month, d.day, tzinfo=datetime.timezone.utc)
+        out.append((utc + datetime.timedelta(minutes=m - offset)).astimezone(tz))
+    return out
+
+
+# Minutes east of UTC of tz in the evening (18:00 local) of each date, DST-aware
+def utc_offsets(dates, tz):
+    offsets = []
+    for d in dates:
+        evening = datetime.datetime(d.year, d.month, d.day, 18, tzinfo=datetime.timezone.utc)
+        # The offset at 18:00 UTC tells when 18:00 local is
+        guess = evening.astimezone(tz).utcoffset()
+        offsets.append((evening - guess).astimezone(tz).utcoffset().total_seconds() / 60)
+    return np.array(offsets)
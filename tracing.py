@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight tracing: timed spans, cache counters and structured JSON logs.
+
+    with tracing.span("get_location", city=city_name):
+        ...
+    tracing.count("geocode.miss")
+
+Every finished span is logged as one JSON line on the "big_ring_theory.trace"
+logger. BRT_TRACE_FORMAT=otel switches the records to the OpenTelemetry
+(OTLP/JSON) span layout; BRT_TRACE_LOG sets where they go ("stderr" by
+default, a file path, or "off").
+
+tracing.collect() gathers the spans and counters of one request, including
+those started in upstream worker threads, for the Streamlit debug panel.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import Counter
+
+
+TRACE_FORMAT = os.environ.get("BRT_TRACE_FORMAT", "json")
+TRACE_LOG = os.environ.get("BRT_TRACE_LOG", "stderr")
+
+logger = logging.getLogger("big_ring_theory.trace")
+
+_current_trace = contextvars.ContextVar("brt_trace", default=None)
+_current_span = contextvars.ContextVar("brt_span", default=None)
+
+_counters_lock = threading.Lock()
+_counters = Counter()
+
+
+def _setup_logger():
+    if logger.handlers or TRACE_LOG == "off":
+        return
+    handler = logging.StreamHandler() if TRACE_LOG == "stderr" else logging.FileHandler(TRACE_LOG)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+_setup_logger()
+
+
+# Spans and counters of one request
+class Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def _add_span(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def _count(self, name, n):
+        with self._lock:
+            self.counters[name] += n
+
+    # Spans in start order as rows for display: name, start offset and duration in ms, attributes
+    def table(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        if not spans:
+            return []
+        t0 = spans[0]["start"]
+        depth = {}
+        rows = []
+        for s in spans:
+            depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1
+            rows.append({
+                "span": "  " * depth[s["span_id"]] + s["name"],
+                "start_ms": round((s["start"] - t0) * 1000, 1),
+                "duration_ms": round(s["duration_ms"], 1),
+                "attributes": ", ".join(f"{k}={v}" for k, v in s["attributes"].items()),
+            })
+        return rows
+
+
+def _otel_record(record):
+    attributes = [{"key": k, "value": {"stringValue": str(v)}} for k, v in record["attributes"].items()]
+    return {
+        "traceId": record["trace_id"],
+        "spanId": record["span_id"],
+        "parentSpanId": record["parent_id"] or "",
+        "name": record["name"],
+        "startTimeUnixNano": int(record["start"] * 1e9),
+        "endTimeUnixNano": int((record["start"] + record["duration_ms"] / 1000) * 1e9),
+        "status": {"code": 2 if record["error"] else 1},
+        "attributes": attributes,
+    }
+
+
+def _log(record):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if TRACE_FORMAT == "otel":
+        line = _otel_record(record)
+    else:
+        line = {"event": "span", "name": record["name"], "trace_id": record["trace_id"],
+                "span_id": record["span_id"], "parent_id": record["parent_id"],
+                "duration_ms": round(record["duration_ms"], 3), "error": record["error"],
+                "attributes": record["attributes"]}
+    logger.info(json.dumps(line, default=str, ensure_ascii=False))
+
+
+# Time a block; attributes can be added to the yielded dict while it runs
+@contextlib.contextmanager
+def span(name, **attributes):
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    span_id = secrets.token_hex(8)
+    trace_id = trace.trace_id if trace is not None else (parent[0] if parent else secrets.token_hex(16))
+    token = _current_span.set((trace_id, span_id))
+
+    start = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        record = {"name": name, "trace_id": trace_id, "span_id": span_id,
+                  "parent_id": parent[1] if parent else None, "start": start,
+                  "duration_ms": (time.perf_counter() - t0) * 1000, "error": error,
+                  "attributes": attributes}
+        if trace is not None:
+            trace._add_span(record)
+        _log(record)
+
+
+# Decorator form of span()
+def traced(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Add to a named counter, process-wide and in the current trace
+def count(name, n=1):
+    with _counters_lock:
+        _counters[name] += n
+    trace = _current_trace.get()
+    if trace is not None:
+        trace._count(name, n)
+
+
+# Process-wide counter totals
+def counters():
+    with _counters_lock:
+        return dict(_counters)
+
+
+# Collect everything traced inside the block into a Trace
+@contextlib.contextmanager
+def collect():
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+# Run fn in another thread with the caller's trace context (for executor.submit)
+# Bind once per submitted call: a copied context can only be entered by one thread at a time
+def bind(fn):
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+    return run
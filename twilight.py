@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Evening twilight bands (golden hour, pink time, blue hour).
+
+Instead of stepping through the evening minute by minute, the time at which
+the sun crosses each band edge is found by bracketing root-finding on
+astral's elevation between solar noon and the following solar midnight,
+where the elevation only falls.
+
+This is the reference implementation: the app computes the bands for whole
+windows with solar.band_times(), and benchmarks/solar_accuracy.py checks it
+against pink_time_window() here.
+"""
+
+import datetime
+
+from astral.sun import noon, elevation
+
+
+# Evening elevation bands in degrees, as (lower, upper)
+BANDS = {
+    "golden_hour": (-4, 6),
+    "pink_time": (-4, -1),
+    "blue_hour": (-6, -4),
+}
+
+PINK_TIME = BANDS["pink_time"]
+
+
+# Time (seconds after noon) at which the falling sun crosses the target elevation
+# Illinois variant of regula falsi on the bracket [0, span]; None if never crossed
+def _crossing(observer, noon_utc, span, target, tol=1.0, max_iter=50):
+    def f(seconds):
+        return elevation(observer, noon_utc + datetime.timedelta(seconds=seconds)) - target
+
+    a, b = 0.0, span
+    f_a, f_b = f(a), f(b)
+    if f_a < 0 or f_b > 0:
+        # Sun never gets above (polar night) or below (white night) this elevation
+        return None
+
+    c, side = a, 0
+    for _ in range(max_iter):
+        c_prev = c
+        c = (a * f_b - b * f_a) / (f_b - f_a)
+        f_c = f(c)
+        if f_c > 0:
+            a, f_a = c, f_c
+            if side == 1:
+                f_b /= 2
+            side = 1
+        else:
+            b, f_b = c, f_c
+            if side == -1:
+                f_a /= 2
+            side = -1
+        if abs(c - c_prev) < tol or f_c == 0:
+            break
+    return c
+
+
+# Start and end of several elevation bands on the evening of one date
+# Returns {name: (start, end)} with times in tzinfo, or {name: None} where a band is never reached
+def twilight_windows(observer, date, bands=BANDS, tzinfo=datetime.timezone.utc):
+    noon_utc = noon(observer, date, tzinfo=datetime.timezone.utc)
+    span = 12 * 3600.0
+
+    # Band edges are shared (pink time ends where blue hour starts), so solve each once
+    crossings = {}
+    for lower, upper in bands.values():
+        for edge in (lower, upper):
+            if edge not in crossings:
+                crossings[edge] = _crossing(observer, noon_utc, span, edge)
+
+    windows = {}
+    for name, (lower, upper) in bands.items():
+        start, end = crossings[upper], crossings[lower]
+        if start is None or end is None:
+            windows[name] = None
+            continue
+        windows[name] = (
+            (noon_utc + datetime.timedelta(seconds=start)).astimezone(tzinfo),
+            (noon_utc + datetime.timedelta(seconds=end)).astimezone(tzinfo),
+        )
+    return windows
+
+
+# Pink time (sun between -1° and -4° by default) on the evening of one date, or None
+def pink_time_window(observer, date, band=PINK_TIME, tzinfo=datetime.timezone.utc):
+    return twilight_windows(observer, date, {"band": band}, tzinfo)["band"]
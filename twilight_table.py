@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Precomputed latitude × day-of-year table of evening twilight.
+
+Civil twilight duration (f1) depends almost only on latitude and the day
+of the year. This table stores, for every LAT_STEP of latitude and each of
+the 366 days of a leap year:
+
+    F1           minutes from sunset to dusk (civil twilight)
+    WHITE_NIGHT  1 where astral finds no sunset or dusk (white night, polar night)
+
+Pink time isn't stored: engine.py gets it, for the few days it shows, from
+the vectorized solar equations (solar.py).
+
+Lookups interpolate linearly between the two nearest latitude rows. Where
+the neighbouring cells (both rows, the day before and after) disagree about
+white nights, or their f1 differ by more than MAX_ROW_DIFF minutes (close to
+the white-night boundary, where f1 grows without bound), lookup() returns
+NaN and the caller computes the day exactly. Everywhere else the
+interpolated values are within ERROR_BOUND minutes of astral at any
+longitude and year (benchmarks/twilight_accuracy.py measures it; most of
+the error comes from the half-day shift of sunset with longitude).
+
+The table is optional. Build it once (about a minute and a half on one core):
+
+    python twilight_table.py --workers 8
+
+and it is memory-mapped from the cache directory on first use. A table
+built with other columns (older versions also stored pink time) is ignored
+until it is rebuilt.
+"""
+
+import argparse
+import datetime
+import math
+import os
+import sys
+import threading
+
+import geo
+
+
+TABLE_PATH = os.path.join(geo.CACHE_DIR, "twilight_table.npy")
+
+LAT_STEP = 0.1
+F1, WHITE_NIGHT = range(2)
+N_COLUMNS = 2
+
+MAX_ROW_DIFF = 1.0       # minutes between neighbouring rows beyond which lookups fall back
+ERROR_BOUND = 1.5        # minutes, for F1
+
+# Leap year whose calendar gives every month-day its own row
+_TABLE_YEAR = 2024
+
+_lock = threading.Lock()
+_table = None
+_loaded = False
+
+
+def day_row(d):
+    return datetime.date(_TABLE_YEAR, d.month, d.day).timetuple().tm_yday - 1
+
+
+# One latitude row: (366, N_COLUMNS) float32, computed with astral at longitude 0
+def _compute_row(lat):
+    import numpy as np
+    from astral import Observer
+    from astral.sun import sun
+
+    observer = Observer(lat, 0.0)
+    row = np.full((366, N_COLUMNS), np.nan, dtype=np.float32)
+    for i in range(366):
+        d = datetime.date(_TABLE_YEAR, 1, 1) + datetime.timedelta(days=i)
+        try:
+            s = sun(observer, date=d)
+        except Exception:
+            row[i, WHITE_NIGHT] = 1
+            continue
+        row[i, WHITE_NIGHT] = 0
+        row[i, F1] = (s["dusk"] - s["sunset"]).total_seconds() / 60
+    return row
+
+
+def latitudes(step=LAT_STEP):
+    n = int(round(180 / step)) + 1
+    return [-90 + i * step for i in range(n)]
+
+
+# Compute the whole table and write it atomically to path
+def build(path=TABLE_PATH, step=LAT_STEP, workers=None):
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    lats = latitudes(step)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(lats), 366, N_COLUMNS))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, row in enumerate(pool.map(_compute_row, lats, chunksize=16)):
+            table[i] = row
+    table.flush()
+    del table
+    os.replace(tmp, path)
+    return len(lats)
+
+
+# Memory-mapped table, or None when it hasn't been built (or was built with other columns)
+def get_table():
+    global _table, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if os.path.exists(TABLE_PATH):
+                    import numpy as np
+                    table = np.load(TABLE_PATH, mmap_mode="r")
+                    if table.ndim == 3 and table.shape[1:] == (366, N_COLUMNS):
+                        _table = table
+                _loaded = True
+    return _table
+
+
+# Forget the loaded table (after rebuilding it)
+def reset():
+    global _table, _loaded
+    with _lock:
+        _table = None
+        _loaded = False
+
+
+# (len(dates), N_COLUMNS) array of F1 and WHITE_NIGHT at a latitude,
+# NaN in every column for days the table can't answer; None without a table
+def lookup(lat, dates):
+    import numpy as np
+
+    table = get_table()
+    if table is None:
+        return None
+
+    step = 180 / (table.shape[0] - 1)
+    pos = (min(max(lat, -90.0), 90.0) + 90) / step
+    i0 = min(int(math.floor(pos)), table.shape[0] - 2)
+    w = pos - i0
+
+    rows = np.array([day_row(d) for d in dates], dtype=np.intp)
+    # The previous and next day too: a date's row shifts by up to half a day with longitude and year
+    around = np.stack([(rows - 1) % 366, rows, (rows + 1) % 366])
+    cells = np.asarray(table[i0:i0 + 2][:, around], dtype=np.float64)    # (2 lats, 3 days, n, N_COLUMNS)
+    lo, hi = cells[0, 1], cells[1, 1]
+    out = lo * (1 - w) + hi * w
+
+    white = cells[..., WHITE_NIGHT]
+    f1 = cells[..., F1]
+    all_white = (white == 1).all(axis=(0, 1))
+    out[all_white] = np.nan
+    out[all_white, WHITE_NIGHT] = 1
+
+    with np.errstate(invalid="ignore"):
+        steep = ((np.abs(f1[1] - f1[0]) > MAX_ROW_DIFF).any(axis=0)
+                 | (np.abs(np.diff(f1, axis=1)) > MAX_ROW_DIFF).any(axis=(0, 1)))
+    mixed = (white == 1).any(axis=(0, 1)) & ~all_white
+    unknown = ~all_white & (mixed | steep)
+    out[unknown] = np.nan
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the latitude × day-of-year twilight table.")
+    parser.add_argument("--step", type=float, default=LAT_STEP, help="latitude step in degrees")
+    parser.add_argument("--out", default=TABLE_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rows = build(args.out, args.step, args.workers)
+    print(f"{rows} latitudes × 366 days written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP access to the upstream APIs (Open-Meteo archive and air quality).
+
+All calls share one keep-alive requests.Session and one thread pool, and
+every request has a timeout. fetch_many() sends a batch of requests
+concurrently and returns each result, or the exception it raised, in order,
+so one failed call doesn't take the rest of the batch down with it.
+Identical requests that overlap in time are coalesced into one, and every
+host goes through its own ratelimit.Limiter: rate and concurrency limits,
+with retries and backoff on 429, 5xx, timeouts and connection errors.
+Bodies are decoded with orjson when it is installed, the json module
+otherwise.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import ratelimit
+import singleflight
+import tracing
+
+
+TIMEOUT = (5, 20)      # seconds: (connect, read)
+POOL_SIZE = 16
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+_loads = None
+_flights = singleflight.group("upstream")
+
+
+# One pooled keep-alive session for the whole process
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="upstream")
+    return _executor
+
+
+def _fetch_json(url, params, timeout):
+    return ratelimit.limiter(urlsplit(url).netloc).call(_fetch_once, url, params, timeout)
+
+
+# One attempt; failures worth repeating are raised as ratelimit.Retryable
+def _fetch_once(url, params, timeout):
+    import requests
+
+    with tracing.span("http.get", url=url) as attributes:
+        try:
+            res = get_session().get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ratelimit.Retryable(e)
+        attributes["status"] = res.status_code
+        attributes["bytes"] = len(res.content)
+        if res.status_code in RETRY_STATUS:
+            retry_after = res.headers.get("Retry-After")
+            try:
+                res.raise_for_status()
+            except requests.HTTPError as e:
+                raise ratelimit.Retryable(e, float(retry_after) if retry_after and retry_after.isdigit() else None)
+        res.raise_for_status()
+        return decode_json(res.content)
+
+
+# Python objects from a JSON body (bytes or str)
+# orjson parses the large Open-Meteo responses several times faster; it is optional
+def decode_json(body):
+    global _loads
+    if _loads is None:
+        try:
+            import orjson
+            _loads = orjson.loads
+        except ImportError:
+            import json
+            _loads = json.loads
+    return _loads(body)
+
+
+# Hashable identity of a request: the URL plus its parameters in a fixed order
+def _request_key(url, params):
+    items = []
+    for name, value in sorted((params or {}).items()):
+        items.append((name, tuple(value) if isinstance(value, (list, tuple)) else value))
+    return url, tuple(items)
+
+
+# GET url and decode the JSON body; raises on network errors and non-2xx responses
+# Identical requests already in flight share one round trip; treat the result as read-only.
+def get_json(url, params=None, timeout=TIMEOUT):
+    return _flights.do(_request_key(url, params), _fetch_json, url, params, timeout)
+
+
+# Run many (url, params) GETs concurrently
+# Returns one entry per request, in order: the decoded JSON, or the exception raised
+def fetch_many(calls, timeout=TIMEOUT):
+    # Each call carries the caller's trace context into the worker thread
+    futures = [_get_executor().submit(tracing.bind(get_json), url, params, timeout) for url, params in calls]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Historical weather and air quality for a scoring window.
+
+The climatology for a date is the average of the same calendar day in each
+of the lookback years, counted back from the newest year the archive has
+(dates less than a year ahead of last_history_day() skip the latest year).
+plan_ranges() turns the scoring window into the fewest contiguous date
+ranges that cover exactly those past days (one per year for a 30-day
+window, fewer when ranges touch), so each range needs one archive and one
+air-quality call. iter_climatology() fetches the ranges
+concurrently and, each time one arrives, yields the average of the years
+received so far, one row per window date. Responses are decoded straight
+into float32 arrays indexed by day offset (no timestamp parsing in the
+normal case) and the years are averaged in place. Days already downloaded
+come from climate_store instead of the network.
+score_weather() turns the climatology into weather_score and vibe columns.
+"""
+
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import astro
+import climate_store
+import tracing
+import upstream
+
+
+# Overridable so benchmarks and load tests can point at a local stand-in server
+ARCHIVE_URL     = os.environ.get("BRT_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+AIR_QUALITY_URL = os.environ.get("BRT_AIR_QUALITY_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+
+DAILY_VARS  = ["temperature_2m_max", "precipitation_sum", "cloud_cover_mean", "wind_speed_10m_max"]
+HOURLY_VARS = ["pm2_5", "ozone"]
+COLUMNS     = DAILY_VARS + HOURLY_VARS
+
+# Used when the air-quality API has no data for a day
+AQ_DEFAULTS = {"pm2_5": 10.0, "ozone": 300.0}
+
+# Days with fewer measured hours than this count as missing air quality
+MIN_AQ_HOURS = 6
+
+LOOKBACK_YEARS = 3
+
+# Runs the per-range fetch_history calls of iter_climatology (each waits on the upstream pool)
+_range_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="brt-climate")
+
+
+# Same calendar day `years` later (earlier if negative); 29 February becomes the 28th
+def shift_years(d, years):
+    try:
+        return d.replace(year=d.year + years)
+    except ValueError:
+        return d.replace(year=d.year + years, day=28)
+
+
+# Newest day the archive is asked for: it has nothing for the last few days, and they may
+# still be revised
+def last_history_day():
+    return datetime.date.today() - datetime.timedelta(days=climate_store.STABLE_AFTER_DAYS)
+
+
+# Ordinal of the past day behind each window date in each lookback year, as a (days × years)
+# array: the same calendar day 1..lookback_years years back, or further back for dates whose
+# day one year back is newer than last_history_day()
+def lookback_days(start_date, days, lookback_years=LOOKBACK_YEARS):
+    last = last_history_day()
+    out = np.empty((days, lookback_years), dtype=np.int64)
+    for i, d in enumerate(astro.window_dates(start_date, days)):
+        first = 1
+        while shift_years(d, -first) > last:
+            first += 1
+        out[i] = [shift_years(d, -k).toordinal() for k in range(first, first + lookback_years)]
+    return out
+
+
+# Fewest (start, end) ranges covering the lookback days of the window; years whose days touch
+# are merged into one range, and so are the two sides of a 29 February no window date maps to
+def plan_ranges(start_date, days, lookback_years=LOOKBACK_YEARS):
+    return _ranges_of(lookback_days(start_date, days, lookback_years))
+
+
+def _ranges_of(ordinals):
+    ordinals = np.unique(ordinals)
+    breaks = np.flatnonzero(np.diff(ordinals) > 2)
+    starts = np.concatenate(([ordinals[0]], ordinals[breaks + 1]))
+    ends = np.concatenate((ordinals[breaks], [ordinals[-1]]))
+    return [(datetime.date.fromordinal(int(a)), datetime.date.fromordinal(int(b))) for a, b in zip(starts, ends)]
+
+
+def _range_calls(lat, lon, start, end):
+    common = {"latitude": lat, "longitude": lon,
+              "start_date": start.isoformat(), "end_date": end.isoformat(), "timezone": "auto"}
+    return [(ARCHIVE_URL, dict(common, daily=DAILY_VARS)),
+            (AIR_QUALITY_URL, dict(common, hourly=HOURLY_VARS))]
+
+
+# Hourly series as one (days × 24) float32 array per variable, row i being day first + i
+# Open-Meteo returns whole local days from 00:00, so the values normally reshape as they are and
+# only the first and last timestamps are read; otherwise (gaps, DST days) each value is placed by
+# its own date and hour. Missing hours are NaN.
+def _hourly_grid(hourly, variables):
+    times = hourly.get("time") or []
+    if not times:
+        return None, {}
+    first = datetime.date.fromisoformat(times[0][:10])
+    n_days = (datetime.date.fromisoformat(times[-1][:10]) - first).days + 1
+
+    contiguous = len(times) == 24 * n_days and times[0][11:13] == "00"
+    if not contiguous:
+        slots = np.array([(datetime.date.fromisoformat(t[:10]) - first).days * 24 + int(t[11:13]) for t in times])
+
+    grids = {}
+    for var in variables:
+        if var not in hourly:
+            continue
+        values = np.array(hourly[var], dtype=np.float32)       # None (no data) becomes NaN
+        if contiguous:
+            grids[var] = values.reshape(n_days, 24)
+        else:
+            grid = np.full(n_days * 24, np.nan, dtype=np.float32)
+            grid[slots] = values
+            grids[var] = grid.reshape(n_days, 24)
+    return first, grids
+
+
+# Daily mean, min and max of hourly air quality
+# Returns (first, {var: {"mean", "min", "max", "hours"}}), row i of each array being day
+# first + i (first is None without data); days with fewer than MIN_AQ_HOURS measured hours
+# are NaN in mean, min and max
+def daily_air_quality(hourly, variables=HOURLY_VARS):
+    first, grids = _hourly_grid(hourly, variables)
+    stats = {}
+    for var, grid in grids.items():
+        missing = np.isnan(grid)
+        hours = 24 - missing.sum(axis=1)
+        enough = hours >= MIN_AQ_HOURS
+        total = np.where(missing, 0, grid).sum(axis=1, dtype=np.float64)
+        stats[var] = {
+            "mean":  np.where(enough, total / np.maximum(hours, 1), np.nan),
+            "min":   np.where(enough, np.where(missing, np.inf, grid).min(axis=1), np.nan),
+            "max":   np.where(enough, np.where(missing, -np.inf, grid).max(axis=1), np.nan),
+            "hours": hours,
+        }
+    return first, stats
+
+
+# Row of each day of a daily "time" list in a block that starts at `start`
+# The archive returns exactly the requested days, which is checked on the first and last
+# timestamps only; anything else is placed by parsing every date
+def _day_rows(times, start, n_days):
+    end = start + datetime.timedelta(days=n_days - 1)
+    if len(times) == n_days and times[0] == start.isoformat() and times[-1] == end.isoformat():
+        return np.arange(n_days)
+    return np.array([(datetime.date.fromisoformat(t[:10]) - start).days for t in times], dtype=np.intp)
+
+
+# One range's responses decoded into a (days × COLUMNS) float32 block, row i being day start + i,
+# with the daily variables and daily-mean air quality; returns (block, present) where present
+# marks the days the archive returned. Air quality the API doesn't have is left as NaN
+def _range_block(w_data, aq_data, start, end):
+    n_days = (end - start).days + 1
+    block = np.full((n_days, len(COLUMNS)), np.nan, dtype=np.float32)
+    present = np.zeros(n_days, dtype=bool)
+
+    daily = w_data["daily"]
+    rows = _day_rows(daily["time"], start, n_days)
+    inside = (rows >= 0) & (rows < n_days)
+    rows = rows[inside]
+    present[rows] = True
+    for j, var in enumerate(DAILY_VARS):
+        if var in daily:
+            block[rows, j] = np.array(daily[var], dtype=np.float32)[inside]
+
+    if "hourly" in aq_data:
+        first, stats = daily_air_quality(aq_data["hourly"])
+        if first is not None:
+            offset = (first - start).days
+            for var, s in stats.items():
+                j = COLUMNS.index(var)
+                lo, hi = max(offset, 0), min(offset + len(s["mean"]), n_days)
+                if lo < hi:
+                    block[lo:hi, j] = s["mean"][lo - offset:hi - offset]
+    return block, present
+
+
+# Download the given ranges; returns (start, block, present, complete) per range that returned
+# weather. complete is False when the air-quality call failed, so the block must not be stored
+# Ranges that failed are listed in the span's "errors" attribute, for the log and debug panel
+def _download(lat, lon, ranges):
+    calls = []
+    for start, end in ranges:
+        calls += _range_calls(lat, lon, start, end)
+
+    results, errors = [], []
+    with tracing.span("climate.download", ranges=len(ranges)) as attributes:
+        responses = upstream.fetch_many(calls)
+        for i, (start, end) in enumerate(ranges):
+            w_data, aq_data = responses[2 * i], responses[2 * i + 1]
+            if isinstance(w_data, Exception):
+                errors.append(f"weather {start} ~ {end}: {w_data}")
+                continue
+            complete = not isinstance(aq_data, Exception)
+            if not complete:
+                errors.append(f"air quality {start} ~ {end}: {aq_data}")
+                aq_data = {}
+            try:
+                block, present = _range_block(w_data, aq_data, start, end)
+            except Exception as e:
+                errors.append(f"reading {start} ~ {end}: {e}")
+                continue
+            results.append((start, block, present, complete))
+        if errors:
+            attributes["errors"] = "; ".join(errors)
+            tracing.count("climate.range_error", len(errors))
+    return results
+
+
+# Historical days for the given ranges as (first, values, final): a (days × COLUMNS) float32
+# array whose row i is day first + i, spanning all the ranges, and a mask of the days read
+# from the local store, which won't change; None when no day is available
+# Days already in the store are copied from disk; only the missing ones are downloaded. Days
+# without weather (a failed range, gaps between ranges) are all NaN; missing air quality falls
+# back to AQ_DEFAULTS. Downloaded days whose air-quality call failed, or too recent to be
+# stable, are returned but not stored, so they are not final
+def fetch_history(lat, lon, ranges):
+    cell = climate_store.cell_of(lat, lon)
+    missing = climate_store.missing_ranges(cell, ranges, len(COLUMNS))
+
+    n_days = sum((end - start).days + 1 for start, end in ranges)
+    n_missing = sum((end - start).days + 1 for start, end in missing)
+    tracing.count("climate.day_hit", n_days - n_missing)
+    tracing.count("climate.day_miss", n_missing)
+
+    first = min(start for start, _ in ranges)
+    last = max(end for _, end in ranges)
+    values = np.full(((last - first).days + 1, len(COLUMNS)), np.nan, dtype=np.float32)
+    present = np.zeros(len(values), dtype=bool)
+
+    if missing:
+        cell_lat, cell_lon = climate_store.cell_center(cell)
+        for start, block, got, complete in _download(cell_lat, cell_lon, missing):
+            if complete:
+                climate_store.write(cell, start, block, got)
+            row = (start - first).days
+            values[row:row + len(block)][got] = block[got]
+            present[row:row + len(block)] |= got
+    final = np.zeros(len(values), dtype=bool)
+    for start, end in ranges:
+        row = (start - first).days
+        n = (end - start).days + 1
+        climate_store.read_into(cell, start, values[row:row + n], final[row:row + n])
+    present |= final
+
+    if not present.any():
+        return None
+    for var, default in AQ_DEFAULTS.items():
+        column = values[:, COLUMNS.index(var)]
+        column[present & np.isnan(column)] = default
+    return first, values, final
+
+
+# Download the lookback history of a whole window into the climate store in one go, so that
+# iter_climatology() over parts of the window reads it from disk
+def prefetch_history(lat, lon, start_date, days, lookback_years=LOOKBACK_YEARS):
+    fetch_history(lat, lon, plan_ranges(start_date, days, lookback_years))
+
+
+# Average of each window date's calendar day over the lookback years, one range at a time:
+# yields (ranges_done, ranges_total, climatology, complete) whenever a range arrives, averaged
+# over the years received so far. Indexed by window date; dates with no history yet are dropped
+# complete marks the rows averaged over every lookback year from final days, which won't change
+# Nothing is yielded until some history is available; the last yield has ranges_done == ranges_total
+def iter_climatology(lat, lon, start_date, days, lookback_years=LOOKBACK_YEARS):
+    sources = lookback_days(start_date, days, lookback_years)
+    ranges = _ranges_of(sources)
+    futures = [_range_pool.submit(tracing.bind(fetch_history), lat, lon, [r]) for r in ranges]
+
+    histories = []
+    for done, future in enumerate(as_completed(futures), start=1):
+        hist = future.result()
+        if hist is not None:
+            histories.append(hist)
+        if histories:
+            yield (done, len(ranges)) + _average(histories, start_date, sources)
+
+
+# Mean over the lookback years of each window date's calendar day, from (first, values, final)
+# histories covering disjoint days; sources holds the lookback days of each date, as from
+# lookback_days(). Sums and counts are accumulated in place per year
+# Returns (climatology, complete) as described in iter_climatology
+def _average(histories, start_date, sources):
+    days = len(sources)
+    dates = astro.window_dates(start_date, days)
+    sums = np.zeros((days, len(COLUMNS)), dtype=np.float64)
+    counts = np.zeros((days, len(COLUMNS)), dtype=np.int32)
+    final_years = np.zeros(days, dtype=np.int32)
+    for ordinals in sources.T:
+        for first, values, final in histories:
+            rows = ordinals - first.toordinal()
+            inside = np.flatnonzero((rows >= 0) & (rows < len(values)))
+            if not len(inside):
+                continue
+            sample = values[rows[inside]]
+            valid = ~np.isnan(sample)
+            sums[inside] += np.where(valid, sample, 0)
+            counts[inside] += valid
+            final_years[inside] += final[rows[inside]]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / counts
+    keep = np.flatnonzero(counts.any(axis=1))
+    complete = final_years[keep] == sources.shape[1]
+    return pd.DataFrame(mean[keep], index=[dates[i] for i in keep], columns=COLUMNS), complete
+
+
+VIBE_WATER  = "💧 WATER | Trust the flow; clarity comes after the soak."
+VIBE_AIR    = "🌬️ AIR | Fresh perspectives are heading your way."
+VIBE_COTTON = "🩷 Cotton-candy sky | The ozone is electric. Expect majestic sky hues."
+VIBE_ETHER  = "✨ ETHER | THE Perfect Match. The sky is cosmically aligned."
+VIBE_FIRE   = "🔥 FIRE | Fortune favors the bold—make that big move today."
+VIBE_EARTH  = "🌿 EARTH | Grounded and stable. A day for steady progress."
+
+
+# Ideal afternoon high for each month in an array, by hemisphere
+def ideal_temperature(lat, months):
+    months = np.asarray(months)
+    summer, winter = ([6, 7, 8], [12, 1, 2]) if lat > 0 else ([12, 1, 2], [6, 7, 8])
+    return np.select([np.isin(months, summer), np.isin(months, winter), np.isin(months, [3, 4, 5])],
+                     [20, 5, 15], default=12)
+
+
+# weather_score and vibe for every row of a climatology frame at once
+# Needs the archive/air-quality columns plus ideal_t. NaN inputs behave as in the
+# original row-by-row version (fmin/fmax ignore NaN like Python's min/max did).
+def score_weather(daily_avg):
+    cloud  = daily_avg['cloud_cover_mean'].to_numpy(dtype=float)
+    temp   = daily_avg['temperature_2m_max'].to_numpy(dtype=float)
+    ozone  = daily_avg['ozone'].to_numpy(dtype=float)
+    precip = daily_avg['precipitation_sum'].to_numpy(dtype=float)
+    wind   = daily_avg['wind_speed_10m_max'].to_numpy(dtype=float)
+    pm2_5  = daily_avg['pm2_5'].to_numpy(dtype=float)
+    ideal_t = daily_avg['ideal_t'].to_numpy(dtype=float)
+
+    c_score = (100 - cloud) / 100                                # 0–1
+    t_score = np.exp(-((temp - ideal_t)**2) / (2 * 5**2))
+    color_bonus = np.fmin(0.1, (ozone / 350) * 0.1)              # was max 10, now max 0.1
+
+    r_mult = np.where(precip < 0.1, 1.0, np.fmax(0,   1 - precip / 3))
+    w_mult = np.where(wind   < 12,  1.0, np.fmax(0.1, 1 - wind / 18))
+    p_mult = np.where(pm2_5  < 10,  1.0, np.fmax(0,   1 - (pm2_5 - 10) / 40))
+
+    finalw_score = (c_score * 0.35) + (t_score * 0.20) + (r_mult * 0.25) + (w_mult * 0.15) + (p_mult * 0.05) + color_bonus
+
+    vibe = np.select(
+        [r_mult < 0.9, w_mult < 0.9, color_bonus > 8.5, finalw_score > 80, t_score > 80],
+        [VIBE_WATER,   VIBE_AIR,     VIBE_COTTON,       VIBE_ETHER,        VIBE_FIRE],
+        default=VIBE_EARTH)
+
+    # Scores stay on a 0-1 scale so display is clean percentage everywhere
+    return pd.DataFrame({'weather_score': np.round(finalw_score, 4), 'vibe': vibe}, index=daily_avg.index)